@@ -0,0 +1,352 @@
+'''
+Performance baselines of the validation hot paths.
+
+Run:
+
+  python benchmark/benchmarks.py --output results.json
+  python benchmark/benchmarks.py --filter constraint. --repeat 10
+
+Then compare two result files (e.g. of two commits) with benchmark/compare.py.
+
+Each benchmark builds its data once and returns a function that runs one
+workload. Scalar workloads handle one object per call, batch workloads handle
+BATCH_SIZE objects per call. The time of a benchmark is the best of --repeat
+rounds, each round calling the workload enough times to take about --duration
+seconds. Memory is the tracemalloc peak of one call of the workload.
+'''
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataobjects'))
+
+from domain import persistence
+from domain import pickling
+from domain import validator
+from domain.dataobjects import DataObject, Entity, ValueObject, OrderedValueObject
+
+BATCH_SIZE = 1000
+FIELD_COUNTS = (1, 10, 100)
+SEED = 20090308
+
+BENCHMARKS = {}
+
+def benchmark(name, batch=False):
+  '''
+  Register a function that prepares a workload and returns it
+  '''
+  def register(prepare):
+    BENCHMARKS[name] = (prepare, batch)
+    return prepare
+  return register
+
+def entityClass(fieldCount, constraints=None):
+  '''
+  Entity with fieldCount int variables, each one with Nullable/Min/Max constraints
+  '''
+  class BenchmarkEntity(Entity):
+    def __init__(self, value):
+      for index in range(fieldCount):
+        setattr(self, 'field%03d' % index, value)
+  for index in range(fieldCount):
+    BenchmarkEntity.addConstraints('field%03d' % index, **(constraints or dict(Nullable = False, Min = 0, Max = 100)))
+  return BenchmarkEntity
+
+# validate(), errors() and valid()
+
+def registerValidation(fieldCount):
+  @benchmark('validate.valid.fields%03d' % fieldCount)
+  def validateValid():
+    obj = entityClass(fieldCount)(50)
+    return obj.validate
+
+  @benchmark('validate.invalid.fields%03d' % fieldCount)
+  def validateInvalid():
+    obj = entityClass(fieldCount)(500)
+    return obj.validate
+
+  @benchmark('errors.fields%03d' % fieldCount)
+  def errors():
+    obj = entityClass(fieldCount)(500)
+    return obj.errors
+
+  @benchmark('valid.fields%03d' % fieldCount)
+  def valid():
+    obj = entityClass(fieldCount)(50)
+    return obj.valid
+
+  @benchmark('batch.errors.fields%03d' % fieldCount, batch=True)
+  def batchErrors():
+    clazz = entityClass(fieldCount)
+    rand = random.Random(SEED)
+    objects = [clazz(rand.randint(-50, 150)) for i in range(BATCH_SIZE)]
+    def run():
+      for obj in objects: obj.errors()
+    return run
+
+for fieldCount in FIELD_COUNTS:
+  registerValidation(fieldCount)
+
+# Built-in constraints: valid() and message() of each one
+
+CONSTRAINT_SAMPLES = {
+  'Min': (3, 5, 1),
+  'Max': (3, 1, 5),
+  'Nullable': (False, 1, None),
+  'Matches': ('^[a-z]+[0-9]$', 'abc1', 'abc'),
+  'InList': (list(range(50)), 49, 50),
+  'Scale': (2, 1.25, 1.255),
+  'Email': (True, 'paulocheque@gmail.com', 'paulocheque'),
+  'IP': (True, '192.168.0.1', '192.168.0.256'),
+  'Site': (True, 'http://www.python.org', 'www.python.org'),
+  'Custom': (lambda x: x % 2 == 0, 2, 1),
+}
+
+def registerConstraint(name, requiredValue, validValue, invalidValue):
+  constraintClass = validator.ConstraintFactory.constraintsRules[name]
+
+  @benchmark('constraint.%s.valid' % name)
+  def valid():
+    constraint = constraintClass('attr', requiredValue, validValue)
+    return constraint.valid
+
+  @benchmark('constraint.%s.invalid' % name)
+  def invalid():
+    constraint = constraintClass('attr', requiredValue, invalidValue)
+    def run():
+      constraint.valid()
+      constraint.message()
+    return run
+
+for name in sorted(CONSTRAINT_SAMPLES):
+  registerConstraint(name, *CONSTRAINT_SAMPLES[name])
+
+@benchmark('constraintFactory.getConstraint')
+def getConstraint():
+  def run():
+    validator.ConstraintFactory.getConstraint('Min', 'attr', 1, 2)
+  return run
+
+# Nested validation
+
+@benchmark('nested.depth3')
+def nested():
+  class Leaf(Entity):
+    def __init__(self, name): self.name = name
+  Leaf.addConstraints('name', Nullable = False, Max = 10)
+  class Node(Entity):
+    def __init__(self, child): self.child = child
+  Node.addConstraints('child', Nullable = False)
+  obj = Node(Node(Node(Leaf('leaf'))))
+  return obj.errors
+
+# ValueObject and OrderedValueObject
+
+class Money(ValueObject):
+  def __init__(self, currency, amount):
+    self.currency = currency
+    self.amount = amount
+
+class ExplicitMoney(Money):
+  def equalsVariables(self):
+    return ['currency', 'amount']
+
+class OrderedMoney(OrderedValueObject):
+  def __init__(self, currency, amount):
+    self.currency = currency
+    self.amount = amount
+
+@benchmark('valueObject.eq.vars')
+def equalsByVars():
+  a, b = Money('BRL', 10), Money('BRL', 10)
+  return lambda: a == b
+
+@benchmark('valueObject.eq.equalsVariables')
+def equalsByEqualsVariables():
+  a, b = ExplicitMoney('BRL', 10), ExplicitMoney('BRL', 10)
+  return lambda: a == b
+
+def repeatedMoneyClass(cacheSize):
+  '''
+  ValueObject of reference data: a few distinct values validated many times
+  '''
+  class RepeatedMoney(ValueObject):
+    validationCacheSize = cacheSize
+    def __init__(self, currency, amount):
+      self.currency = currency
+      self.amount = amount
+  RepeatedMoney.addConstraints('currency', Nullable = False, InList = ['BRL', 'USD', 'EUR'], Matches = '^[A-Z]{3}$')
+  RepeatedMoney.addConstraints('amount', Nullable = False, Min = 0, Max = 1000)
+  return RepeatedMoney
+
+def registerRepeatedValueObjects(name, cacheSize):
+  @benchmark('valueObject.repeated.' + name, batch=True)
+  def repeated():
+    clazz = repeatedMoneyClass(cacheSize)
+    rand = random.Random(SEED)
+    values = [(rand.choice(['BRL', 'USD', 'EUR']), rand.randint(0, 10)) for i in range(BATCH_SIZE)]
+    def run():
+      for currency, amount in values: clazz(currency, amount).errors()
+    return run
+
+registerRepeatedValueObjects('uncached', None)
+registerRepeatedValueObjects('cached', 1024)
+
+@benchmark('orderedValueObject.sort', batch=True)
+def sort():
+  rand = random.Random(SEED)
+  objects = [OrderedMoney(rand.choice(['BRL', 'USD', 'EUR']), rand.randint(0, 1000)) for i in range(BATCH_SIZE)]
+  return lambda: sorted(objects)
+
+# SQLite persistence
+
+@benchmark('persistence.sqlite.insert', batch=True)
+def sqliteInsert():
+  clazz = entityClass(10)
+  rand = random.Random(SEED)
+  objects = [clazz(rand.randint(-10, 110)) for i in range(BATCH_SIZE)]
+  def run():
+    with persistence.SQLiteStore(':memory:', clazz, checks=True) as store:
+      store.insert(objects, chunkSize=250)
+  return run
+
+@benchmark('persistence.sqlite.select', batch=True)
+def sqliteSelect():
+  clazz = entityClass(10)
+  store = persistence.SQLiteStore(':memory:', clazz)
+  store.insert([clazz(50) for i in range(BATCH_SIZE)])
+  def run():
+    for obj in store.select(): pass
+  return run
+
+# pickle, the classes must be importable by name
+
+PICKLE_FIELDS = 10
+
+class PickledEntity(Entity):
+  def __init__(self, value):
+    for index in range(PICKLE_FIELDS):
+      setattr(self, 'field%03d' % index, value)
+
+class CompactEntity(PickledEntity):
+  compactPickling = True
+
+class PlainObject(object):
+  def __init__(self, value):
+    for index in range(PICKLE_FIELDS):
+      setattr(self, 'field%03d' % index, value)
+
+def registerPickle(name, clazz, dumps):
+  @benchmark('pickle.' + name, batch=True)
+  def roundTrip():
+    objects = [clazz(index) for index in range(BATCH_SIZE)]
+    def run():
+      pickle.loads(dumps(objects))
+    return run
+
+registerPickle('default', PlainObject, lambda objects: pickle.dumps(objects, pickle.HIGHEST_PROTOCOL))
+registerPickle('entity', PickledEntity, lambda objects: pickle.dumps(objects, pickle.HIGHEST_PROTOCOL))
+registerPickle('compact', CompactEntity, lambda objects: pickle.dumps(objects, pickle.HIGHEST_PROTOCOL))
+registerPickle('batch', PickledEntity, pickling.dumps)
+
+# __str__
+
+def registerToString(fieldCount):
+  @benchmark('str.fields%03d' % fieldCount)
+  def toString():
+    obj = entityClass(fieldCount)(50)
+    return obj.__str__
+
+for fieldCount in FIELD_COUNTS:
+  registerToString(fieldCount)
+
+@benchmark('str.largeList')
+def toStringLargeList():
+  class Holder(DataObject):
+    def __init__(self): self.values = list(range(10000))
+  return Holder().__str__
+
+# Runner
+
+def measureTime(workload, repeat, duration):
+  timer = timeit.Timer(workload)
+  number, elapsed = timer.autorange()
+  number = max(1, int(number * duration / max(elapsed, 1e-9)))
+  times = [timer.timeit(number) / number for i in range(repeat)]
+  return min(times), sum(times) / len(times)
+
+def measureMemory(workload):
+  gc.collect()
+  tracemalloc.start()
+  try:
+    workload()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+def gitRevision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stderr=subprocess.DEVNULL).decode('ascii').strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def run(names, repeat, duration, log=sys.stderr):
+  results = {}
+  for name in names:
+    prepare, batch = BENCHMARKS[name]
+    random.seed(SEED)
+    workload = prepare()
+    best, mean = measureTime(workload, repeat, duration)
+    results[name] = {
+      'best': best,
+      'mean': mean,
+      'objects': BATCH_SIZE if batch else 1,
+      'perObject': best / (BATCH_SIZE if batch else 1),
+      'peakMemory': measureMemory(workload),
+    }
+    log.write('%-45s %12.3f us %10d bytes\n' % (name, best * 1e6, results[name]['peakMemory']))
+  return results
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description='Benchmarks of python-dataobjects')
+  parser.add_argument('--output', help='JSON file of results')
+  parser.add_argument('--filter', default='', help='run only benchmarks whose name contains this text')
+  parser.add_argument('--repeat', type=int, default=5, help='rounds of each benchmark')
+  parser.add_argument('--duration', type=float, default=0.2, help='approximate seconds of each round')
+  parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+  options = parser.parse_args(args)
+  names = sorted(name for name in BENCHMARKS if options.filter in name)
+  if options.list:
+    print('\n'.join(names))
+    return 0
+  results = run(names, options.repeat, options.duration)
+  report = {
+    'meta': {
+      'revision': gitRevision(),
+      'python': platform.python_implementation() + ' ' + platform.python_version(),
+      'platform': platform.platform(),
+      'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+      'repeat': options.repeat,
+      'duration': options.duration,
+      'batchSize': BATCH_SIZE,
+    },
+    'results': results,
+  }
+  if options.output:
+    with open(options.output, 'w') as output:
+      json.dump(report, output, indent=2, sort_keys=True)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
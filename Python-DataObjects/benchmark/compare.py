@@ -0,0 +1,53 @@
+'''
+Compare two result files of benchmark/benchmarks.py.
+
+  python benchmark/compare.py baseline.json current.json --threshold 0.10
+
+Exit status is 1 when some benchmark is slower (or uses more memory) than the
+baseline by more than the threshold.
+'''
+
+import argparse
+import json
+import sys
+
+def load(path):
+  with open(path) as source:
+    return json.load(source)
+
+def ratio(current, baseline):
+  if not baseline: return None
+  return float(current) / baseline
+
+def compare(baseline, current, threshold):
+  '''
+  Return rows (name, baselineTime, currentTime, timeRatio, memoryRatio, regression)
+  '''
+  rows = []
+  for name in sorted(set(baseline['results']) & set(current['results'])):
+    old, new = baseline['results'][name], current['results'][name]
+    timeRatio = ratio(new['best'], old['best'])
+    memoryRatio = ratio(new['peakMemory'], old['peakMemory'])
+    regression = any(r is not None and r > 1 + threshold for r in (timeRatio, memoryRatio))
+    rows.append((name, old['best'], new['best'], timeRatio, memoryRatio, regression))
+  return rows
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+  parser.add_argument('baseline')
+  parser.add_argument('current')
+  parser.add_argument('--threshold', type=float, default=0.10, help='tolerated relative slowdown')
+  options = parser.parse_args(args)
+  baseline, current = load(options.baseline), load(options.current)
+  rows = compare(baseline, current, options.threshold)
+  print('%-45s %12s %12s %8s %8s' % ('benchmark', 'baseline us', 'current us', 'time', 'memory'))
+  for name, old, new, timeRatio, memoryRatio, regression in rows:
+    print('%-45s %12.3f %12.3f %8s %8s%s' % (name, old * 1e6, new * 1e6,
+      '%.2fx' % timeRatio if timeRatio else '-', '%.2fx' % memoryRatio if memoryRatio else '-',
+      '  REGRESSION' if regression else ''))
+  for name in sorted(set(baseline['results']) ^ set(current['results'])):
+    print('%-45s only in %s' % (name, 'baseline' if name in baseline['results'] else 'current'))
+  return 1 if any(row[-1] for row in rows) else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,230 @@
+'''
+Fail-fast validation that learns which constraints reject most objects.
+
+from domain import adaptive
+
+validator = adaptive.validatorFor(MyEntity)
+for record in records:
+  if not validator.valid(record): reject(record)
+
+The validator stops at the first failed constraint. While it is learning, it
+measures the failure rate and the time of each constraint and, every
+reorderEvery validations, sorts the constraints by failures per second of
+checking, so the constraints that reject more records for less time run first.
+One validation out of sampleEvery runs all constraints, so the rates of the
+constraints that usually run last are still measured.
+
+The learned order can be frozen and shipped to short lived worker processes:
+
+order = validator.exportOrder() # JSON friendly
+...
+adaptive.validatorFor(MyEntity).importOrder(order) # also freezes the validator
+'''
+
+import threading
+import weakref
+from domain import profiling
+from domain.dataobjects import DataObject
+
+class Step(object):
+  '''
+  One check of the plan and what was learned about it
+  '''
+
+  __slots__ = ('attribute', 'check', 'key', 'attributeNames', 'evaluations', 'failures', 'totalTime')
+
+  def __init__(self, attribute, check):
+    self.attribute = attribute
+    self.check = check
+    self.key = (check.attributeName, check.constraintName)
+    # attributes read by the step, a cross check reads many
+    self.attributeNames = getattr(check, 'attributeNames', (check.attributeName,))
+    self.evaluations = 0
+    self.failures = 0
+    self.totalTime = 0.0
+
+  def score(self):
+    '''
+    Estimated failures per second of checking, higher runs first
+    '''
+    failureRate = (self.failures + 1.0) / (self.evaluations + 2.0)
+    if self.evaluations == 0 or self.totalTime <= 0:
+      return failureRate / self.check.cost if self.check.cost else failureRate
+    return failureRate / (self.totalTime / self.evaluations)
+
+  def learn(self, other):
+    self.evaluations = other.evaluations
+    self.failures = other.failures
+    self.totalTime = other.totalTime
+
+  def asDict(self):
+    return {
+      'attribute': self.key[0],
+      'constraint': self.key[1],
+      'evaluations': self.evaluations,
+      'failures': self.failures,
+      'totalTime': self.totalTime,
+    }
+
+
+def gatingFirst(steps):
+  '''
+  Tuple of the steps in the same order, but moving the gating steps of each
+  attribute before the first step that reads the attribute
+  '''
+  gating = {}
+  for step in steps:
+    if step.check.gating: gating.setdefault(step.key[0], []).append(step)
+  ordered = []
+  for step in steps:
+    for attributeName in step.attributeNames:
+      if attributeName in gating:
+        ordered.extend(gating.pop(attributeName))
+    if not step.check.gating:
+      ordered.append(step)
+  return tuple(ordered)
+
+class AdaptiveValidator(object):
+
+  def __init__(self, clazz, reorderEvery=1000, sampleEvery=10):
+    self.clazz = clazz
+    self.reorderEvery = reorderEvery
+    self.sampleEvery = sampleEvery
+    self.frozen = False
+    self.validations = 0
+    self.lock = threading.Lock()
+    self.plan = None
+    self.steps = ()
+    self.__refresh()
+
+  def __refresh(self):
+    '''
+    Rebuild the steps if the constraints of the class changed, keeping what was learned
+    '''
+    plan = self.clazz.validationPlan()
+    if plan is self.plan: return
+    learned = dict((step.key, step) for step in self.steps)
+    pairs = [(attribute, check) for attribute in plan.attributes for check in attribute.checks]
+    # a cross check reads its own value
+    pairs.extend((cross, cross) for cross in plan.crossChecks)
+    steps = []
+    for attribute, check in pairs:
+      step = Step(attribute, check)
+      if step.key in learned: step.learn(learned[step.key])
+      steps.append(step)
+    order = dict((step.key, position) for position, step in enumerate(self.steps))
+    steps.sort(key=lambda step: order.get(step.key, len(order)))
+    self.plan = plan
+    self.steps = gatingFirst(steps)
+    self.nestedAttributes = plan.attributes
+
+  def firstError(self, obj):
+    '''
+    Message of the first failed constraint or None if the object is valid
+    '''
+    self.__refresh()
+    for attribute in self.nestedAttributes:
+      value = attribute.value(obj)
+      if isinstance(value, DataObject):
+        message = validatorFor(value.__class__).firstError(value)
+        if message is not None: return message
+    if self.frozen:
+      return self.__firstError(obj)
+    self.validations += 1
+    message = self.__learn(obj, self.validations % self.sampleEvery == 0)
+    if self.validations % self.reorderEvery == 0:
+      self.reorder()
+    return message
+
+  def valid(self, obj):
+    return self.firstError(obj) is None
+
+  def __firstError(self, obj):
+    for step in self.steps:
+      value = step.attribute.value(obj)
+      constraint = step.check.constraint(value)
+      if not constraint.valid():
+        return constraint.message()
+    return None
+
+  def __learn(self, obj, checkAll):
+    clock = profiling.clock
+    message = None
+    # attributes whose gating constraint failed, their other checks and cross checks are skipped
+    gated = None
+    for step in self.steps:
+      if gated is not None and not gated.isdisjoint(step.attributeNames): continue
+      value = step.attribute.value(obj)
+      constraint = step.check.constraint(value)
+      started = clock()
+      valid = constraint.valid()
+      step.totalTime += clock() - started
+      step.evaluations += 1
+      if not valid:
+        step.failures += 1
+        if message is None:
+          message = constraint.message()
+        if not checkAll: break
+        if step.check.gating:
+          if gated is None: gated = set()
+          gated.add(step.key[0])
+    return message
+
+  def reorder(self):
+    '''
+    Sort the steps by score. Gating checks stay before the other checks of their
+    attribute and before the cross checks that read it.
+    '''
+    with self.lock:
+      self.steps = gatingFirst(sorted(self.steps, key=lambda step: -step.score()))
+
+  def order(self):
+    return [list(step.key) for step in self.steps]
+
+  def freeze(self):
+    self.frozen = True
+
+  def unfreeze(self):
+    self.frozen = False
+
+  def statistics(self):
+    return [step.asDict() for step in self.steps]
+
+  def exportOrder(self):
+    return {
+      'class': self.clazz.__name__,
+      'order': self.order(),
+      'statistics': self.statistics(),
+    }
+
+  def importOrder(self, exported, freeze=True):
+    '''
+    Use an order exported by exportOrder. Unknown constraints are ignored and
+    constraints missing in the exported order run last.
+    '''
+    self.__refresh()
+    positions = dict((tuple(key), position) for position, key in enumerate(exported['order']))
+    learned = dict(((row['attribute'], row['constraint']), row) for row in exported.get('statistics', []))
+    with self.lock:
+      for step in self.steps:
+        row = learned.get(step.key)
+        if row is not None:
+          step.evaluations, step.failures, step.totalTime = row['evaluations'], row['failures'], row['totalTime']
+      self.steps = gatingFirst(sorted(self.steps, key=lambda step: positions.get(step.key, len(positions))))
+    self.frozen = freeze
+
+
+validators = weakref.WeakKeyDictionary()
+validatorsLock = threading.Lock()
+
+def validatorFor(clazz):
+  '''
+  The AdaptiveValidator shared by all users of a class
+  '''
+  validator = validators.get(clazz)
+  if validator is None:
+    with validatorsLock:
+      validator = validators.get(clazz)
+      if validator is None:
+        validator = validators[clazz] = AdaptiveValidator(clazz)
+  return validator
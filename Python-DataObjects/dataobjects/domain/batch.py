@@ -0,0 +1,155 @@
+'''
+Validation of collections of DataObjects in a pool of threads.
+
+Threads pay off when constraints block on I/O, e.g. a Custom constraint that
+queries SQLite or checks if a file exists.
+
+from domain import batch
+
+with batch.BatchValidator(workers=8) as validator:
+  errors = validator.validate(objects) # list of lists of errors, in the order of objects
+
+  # stream the results in order, stopping after 30 seconds or 100 invalid objects
+  run = validator.iterate(objects, deadline=30, errorBudget=100)
+  for obj, errors in run:
+    ...
+  print(run.stopped, run.validated, run.invalid, run.elapsed)
+
+  # or the same, keeping the results
+  run = validator.run(objects, deadline=30, errorBudget=100)
+  print(run.errors)
+
+When a run stops, the chunks that were not started are cancelled and the
+running ones stop before their next object.
+
+Objects are validated with DataObject.collectErrors, that doesn't change the
+objects, so the same object can be in many batches at the same time.
+'''
+
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from domain import profiling
+
+# Reasons to stop a run
+DEADLINE = 'deadline'
+ERROR_BUDGET = 'errorBudget'
+
+def collectChunk(chunk, stop):
+  errors = []
+  for obj in chunk:
+    if stop.is_set(): break
+    errors.append(obj.collectErrors())
+  return errors
+
+def chunks(objects, chunkSize):
+  chunk = []
+  for obj in objects:
+    chunk.append(obj)
+    if len(chunk) == chunkSize:
+      yield chunk
+      chunk = []
+  if chunk: yield chunk
+
+class BatchRun(object):
+  '''
+  Iterable of (object, errors) in the order of the objects.
+  After the iteration, stopped is None, DEADLINE or ERROR_BUDGET.
+  '''
+
+  def __init__(self, validator, objects, deadline=None, errorBudget=None):
+    '''
+    deadline: seconds that the whole run can take
+    errorBudget: maximum number of invalid objects, the run stops when it is exceeded
+    '''
+    self.validator = validator
+    self.objects = objects
+    self.deadline = deadline
+    self.errorBudget = errorBudget
+    self.validated = 0
+    self.invalid = 0
+    self.stopped = None
+    self.elapsed = 0.0
+    self.errors = None
+
+  def __iter__(self):
+    started = profiling.clock()
+    stop = threading.Event()
+    pending = collections.deque()
+    source = chunks(self.objects, self.validator.chunkSize)
+    def submit():
+      while len(pending) < self.validator.window:
+        chunk = next(source, None)
+        if chunk is None: return
+        pending.append((chunk, self.validator.executor.submit(collectChunk, chunk, stop)))
+    try:
+      submit()
+      while pending:
+        chunk, future = pending.popleft()
+        timeout = None
+        if self.deadline is not None:
+          timeout = max(0, self.deadline - (profiling.clock() - started))
+        try:
+          chunkErrors = future.result(timeout)
+        except TimeoutError:
+          self.stopped = DEADLINE
+          return
+        submit()
+        for obj, errors in zip(chunk, chunkErrors):
+          self.validated += 1
+          if errors: self.invalid += 1
+          yield obj, errors
+          if self.errorBudget is not None and self.invalid > self.errorBudget:
+            self.stopped = ERROR_BUDGET
+            return
+    finally:
+      stop.set()
+      for chunk, future in pending:
+        future.cancel()
+      self.elapsed = profiling.clock() - started
+
+  def consume(self):
+    '''
+    Run until the end, keeping the errors of the validated objects
+    '''
+    self.errors = [errors for obj, errors in self]
+    return self
+
+
+class BatchValidator(object):
+
+  def __init__(self, workers=4, chunkSize=64):
+    '''
+    workers: number of threads
+    chunkSize: objects validated by a thread in one task
+    '''
+    self.workers = workers
+    self.chunkSize = chunkSize
+    # chunks submitted but not delivered yet, so big collections are not loaded at once
+    self.window = 2 * workers
+    self.executor = ThreadPoolExecutor(max_workers=workers)
+
+  def validate(self, objects):
+    '''
+    List of the errors of each object, in the same order of objects
+    '''
+    return self.run(objects).errors
+
+  def iterate(self, objects, deadline=None, errorBudget=None):
+    return BatchRun(self, objects, deadline, errorBudget)
+
+  def run(self, objects, deadline=None, errorBudget=None):
+    return BatchRun(self, objects, deadline, errorBudget).consume()
+
+  def close(self):
+    self.executor.shutdown(wait=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+def validateAll(objects, workers=4):
+  with BatchValidator(workers) as validator:
+    return validator.validate(objects)
@@ -0,0 +1,89 @@
+'''
+Size-bounded LRU cache with optional TTL and hit/miss statistics.
+
+from domain.cache import LRUCache
+
+cache = LRUCache(maxSize=1000, ttl=60)
+found, value = cache.lookup(key)
+if not found:
+  value = compute(key)
+  cache.store(key, value)
+print(cache.stats()) # {'hits': 0, 'misses': 1, 'evictions': 0, 'expirations': 0, 'size': 1, 'hitRate': 0.0, ...}
+
+Keys must be hashable. All operations are thread-safe.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache(object):
+
+  def __init__(self, maxSize=1024, ttl=None, clock=time.monotonic):
+    '''
+    maxSize: maximum number of entries, the least recently used entry is evicted first
+    ttl: seconds that an entry lives, None means forever
+    '''
+    if maxSize < 1: raise ValueError('maxSize must be positive')
+    self.maxSize = maxSize
+    self.ttl = ttl
+    self.clock = clock
+    self.lock = threading.Lock()
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  def lookup(self, key):
+    '''
+    Return (True, value) if the key is cached, (False, None) otherwise
+    '''
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is not None:
+        value, expiration = entry
+        if expiration is None or expiration > self.clock():
+          self.entries.move_to_end(key)
+          self.hits += 1
+          return True, value
+        del self.entries[key]
+        self.expirations += 1
+      self.misses += 1
+      return False, None
+
+  def store(self, key, value):
+    expiration = None if self.ttl is None else self.clock() + self.ttl
+    with self.lock:
+      self.entries[key] = (value, expiration)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.maxSize:
+        self.entries.popitem(last=False)
+        self.evictions += 1
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+  def __len__(self):
+    return len(self.entries)
+
+  def hitRate(self):
+    total = self.hits + self.misses
+    return float(self.hits) / total if total else 0.0
+
+  def stats(self):
+    with self.lock:
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'evictions': self.evictions,
+        'expirations': self.expirations,
+        'size': len(self.entries),
+        'maxSize': self.maxSize,
+        'hitRate': self.hitRate(),
+      }
+
+  def resetStats(self):
+    with self.lock:
+      self.hits = self.misses = self.evictions = self.expirations = 0
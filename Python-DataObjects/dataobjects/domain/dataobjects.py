@@ -4,7 +4,26 @@ Created on Mar 8, 2009
 @author: Paulo Cheque (paulocheque@agilbits.com.br)
 '''
 
+import operator
+import weakref
+from domain import hooks
+from domain import profiling
 from domain import validator
+from domain.cache import LRUCache
+
+# Prefix of the name mangled instance variables used internally by DataObject
+INTERNAL_PREFIX = '_DataObject__'
+# Instance variable of an Entity with the original values of the changed variables
+JOURNAL = INTERNAL_PREFIX + 'journal'
+
+class Missing(object):
+  '''
+  Value of a variable that didn't exist, in the changes of an Entity
+  '''
+  def __repr__(self):
+    return 'MISSING'
+
+MISSING = Missing()
 
 class DataObject(object):
   '''
@@ -12,56 +31,667 @@ class DataObject(object):
   '''
 
   constraints = {}
+  crossConstraints = {}
+
+  # Limits of __str__ and __repr__ for large containers and nested objects, None means no limit
+  maxItemsToShow = None
+  maxDepthToShow = None
+  # Pickle each object as a tuple of values with a shared schema, see _compactReduce.
+  # It must be set in the body of the class.
+  compactPickling = False
 
   @classmethod
-  def addConstraints(clazz, attributeName, **attrConstraints):
+  def addConstraints(clazz, attributeName, memoize=None, group=None, **attrConstraints):
+    '''
+    memoize: True or a dict of options of validator.MemoizedFunction to cache the results of the Custom function
+    group: name of a constraint group, None is the default group. See validate.
+    '''
+    if memoize and 'Custom' in attrConstraints:
+      options = memoize if isinstance(memoize, dict) else {}
+      attrConstraints['Custom'] = validator.MemoizedFunction(attrConstraints['Custom'], **options)
+    if group is not None:
+      clazz.__ownGroup(group)[0][attributeName] = attrConstraints
+      rulesChanged(clazz)
+      return
     parentClass = clazz.__mro__[1]
     if id(parentClass.constraints) == id(clazz.constraints):
       clazz.constraints = {}
       clazz.constraints.update(parentClass.constraints)
     clazz.constraints[attributeName] = attrConstraints
+    rulesChanged(clazz)
 
-  def __getValue(self, attributeName):
-    try:
-      return eval('self.' + attributeName)
-    except AttributeError:
-      raise validator.ConstraintException('Constraint error: Invalid attribute')
+  @classmethod
+  def addCrossConstraint(clazz, name, attributeNames, function, message=None, group=None):
+    '''
+    Constraint over many attributes, checked after the constraints of each attribute.
+    function receives the values of the attributes, in the order of attributeNames.
+    message is a string.Template with $name, $attrs, $values and the name of each attribute,
+    None uses the message of the catalog (see domain.messages).
 
-  def __validateInnerDataObject(self, var):
-    eval('self.' + var + '.validate()')
-    innerErrors = eval('self.' + var + '.errors()')
-    self.__currentErrors.extend(innerErrors)
-
-  def validate(self):
-    self.__currentErrors = []
-    for attributeName in self.constraints:
-      value = self.__getValue(attributeName)
-      if issubclass(value.__class__, DataObject):
-        self.__validateInnerDataObject(attributeName)
-      for constraintName in self.constraints[attributeName]:
-        requiredValue = self.constraints[attributeName][constraintName]
-        constraint = validator.ConstraintFactory.getConstraint(constraintName, attributeName, requiredValue, value)
-        if not constraint.valid():
-          self.__currentErrors.append(constraint.message())
+    MyEntity.addCrossConstraint('period', ['start', 'end'], lambda start, end: start <= end,
+                                '$start must not be after $end')
+    '''
+    if group is not None:
+      clazz.__ownGroup(group)[1][name] = (tuple(attributeNames), function, message)
+      rulesChanged(clazz)
+      return
+    parentClass = clazz.__mro__[1]
+    if id(parentClass.crossConstraints) == id(clazz.crossConstraints):
+      clazz.crossConstraints = {}
+      clazz.crossConstraints.update(parentClass.crossConstraints)
+    clazz.crossConstraints[name] = (tuple(attributeNames), function, message)
+    rulesChanged(clazz)
+
+  @classmethod
+  def __ownGroup(clazz, group):
+    '''
+    (constraints, cross constraints) added to a group by this class only.
+    Subclasses don't copy them, the groups are merged through the MRO when a plan is compiled.
+    '''
+    groups = _classCache(clazz, '_DataObject__groups')
+    if group not in groups:
+      groups[group] = ({}, {})
+    return groups[group]
+
+  @classmethod
+  def groups(clazz):
+    '''
+    Sorted names of the constraint groups of this class and its base classes
+    '''
+    names = set()
+    for klass in clazz.__mro__:
+      names.update(klass.__dict__.get('_DataObject__groups', ()))
+    return sorted(names)
+
+  @classmethod
+  def groupConstraints(clazz, group):
+    '''
+    (constraints, cross constraints) of a group: the default constraints replaced,
+    attribute by attribute, by the constraints of the group in the base classes and then in this class.
+    '''
+    if group is None:
+      return clazz.constraints, clazz.crossConstraints
+    if group not in clazz.groups():
+      raise validator.ConstraintException('Constraint error: Unknown group ' + str(group))
+    constraints = dict(clazz.constraints)
+    crossConstraints = dict(clazz.crossConstraints)
+    for klass in reversed(clazz.__mro__):
+      own = klass.__dict__.get('_DataObject__groups', {}).get(group)
+      if own is not None:
+        constraints.update(own[0])
+        crossConstraints.update(own[1])
+    return constraints, crossConstraints
+
+  @classmethod
+  def dependencyGraph(clazz):
+    '''
+    Dict of attribute name to the names of the cross constraints that use it
+    '''
+    return dict((attributeName, [cross.attributeName for cross in crossChecks])
+                for attributeName, crossChecks in clazz.validationPlan().dependents.items())
+
+  @classmethod
+  def validationPlan(clazz, fields=None, group=None):
+    '''
+    The compiled ValidationPlan of the constraints of this class.
+    fields: names of the attributes to validate (or one name), None means all of them.
+    Names that are not constrained nor used by a cross constraint raise a ConstraintException.
+    group: name of the constraint group, None is the default group
+    '''
+    if isinstance(fields, str): fields = (fields,)
+    key = (group, None if fields is None else frozenset(fields))
+    plans = _classCache(clazz, '_DataObject__plans')
+    plan = plans.get(key)
+    if plan is None or plan.version != currentVersion(clazz) or not plan.current():
+      if fields is None:
+        plan = ValidationPlan.compile(clazz, *clazz.groupConstraints(group))
+      else:
+        plan = clazz.validationPlan(group=group)
+        unknown = [field for field in key[1] if not plan.reads(field)]
+        if unknown:
+          raise validator.ConstraintException('Constraint error: Invalid attribute ' + ', '.join(sorted(unknown)))
+        plan = plan.restrict(key[1])
+      if len(plans) >= MAX_PLANS: plans.clear()
+      plans[key] = plan
+    return plan
+
+  @classmethod
+  def validateMapping(clazz, mapping, fields=None, group=None, columns=None, exclude=None):
+    '''
+    Errors of a dict (or a row) as if it were an object of this class, without creating the object.
+    Missing keys are read as None. Nested DataObjects in the mapping are validated too, nested dicts are not.
+    columns: dict of attribute name to key (or index) of the mapping, or list of attribute names of a tuple
+    exclude: attributes that are not validated, nor the cross constraints that read them
+
+    errors = MyEntity.validateMapping(json.loads(payload))
+    if not errors: entity = MyEntity(**payload)
+    '''
+    plan = clazz.validationPlan(fields, group)
+    if exclude: plan = plan.without(exclude)
+    read = MappingReader(columns)
+    if profiling.profiler is None and not hooks.active:
+      return plan.collect(mapping, read)
+    return plan.collectObserved(mapping, profiling.profiler, read)
+
+  @classmethod
+  def validateRows(clazz, rows, columns=None, group=None):
+    '''
+    List of the errors of each dict or tuple of rows, see validateMapping
+
+    MyEntity.validateRows([('a', 1), ('b', -1)], columns = ['name', 'age'])
+    '''
+    plan = clazz.validationPlan(group=group)
+    read = MappingReader(columns)
+    if profiling.profiler is None and not hooks.active:
+      return [plan.collect(row, read) for row in rows]
+    return [plan.collectObserved(row, profiling.profiler, read) for row in rows]
+
+  def collectErrors(self, fields=None, group=None):
+    '''
+    Validate and return a new list of errors, without changing the state of the object.
+    Many threads can validate the same object at the same time.
+    fields: names of the attributes to validate, None means all of them.
+    Cross constraints that use some of the fields are also validated. Variables of
+    this object without constraints are ignored, so e.g. fields = changes() works.
+    group: name of the constraint group, None is the default group.
+    '''
+    if fields is not None: fields = self.__constrained(fields, group)
+    plan = self.validationPlan(fields, group)
+    if profiling.profiler is None and not hooks.active:
+      return plan.collect(self)
+    return plan.collectObserved(self, profiling.profiler)
+
+  def __constrained(self, fields, group):
+    '''
+    fields without the variables of this object that are not read by the constraints
+    '''
+    if isinstance(fields, str): fields = (fields,)
+    plan = self.validationPlan(group=group)
+    state = vars(self)
+    return [field for field in fields if field not in state or plan.reads(field)]
+
+  def validate(self, fields=None, group=None):
+    '''
+    Constraints added with a group are used only when the object is validated with that group,
+    replacing the default constraints of the same attributes:
 
-  def errors(self):
-    self.validate()
-    return self.__currentErrors
+    MyEntity.addConstraints('name', Nullable = False)
+    MyEntity.addConstraints('email', Nullable = False, Email = True)
+    MyEntity.addConstraints('email', group = 'draft') # no constraints for drafts
+    obj.validate(group = 'draft')
+    '''
+    self.__currentErrors = self.collectErrors(fields, group)
+
+  def errors(self, fields=None, group=None):
+    errors = self.collectErrors(fields, group)
+    self.__currentErrors = errors
+    return errors
   
-  def valid(self):
-    return len(self.errors()) == 0
+  def valid(self, fields=None, group=None):
+    return len(self.collectErrors(fields, group)) == 0
 
   def hasErrors(self):
     return not self.valid()
-  
+
+  def fields(self):
+    '''
+    Sorted names of the instance variables, without the internal state of DataObject
+    '''
+    return list(_fieldNames(self))
+
   def __str__(self):
-    string = self.__class__.__name__
-    variables = sorted(vars(self))
-    if len(variables) == 0: return string
-    string += ': '
-    for var in variables:
-      string += (var + '=(' + str(eval('self.' + var)) + '), ')
-    return string[0:len(string)-2]
+    return self.__format(False, 0, (self.maxItemsToShow, self.maxDepthToShow))
+
+  def __repr__(self):
+    return self.__format(True, 0, (self.maxItemsToShow, self.maxDepthToShow))
+
+  def __init_subclass__(clazz, **kwargs):
+    super().__init_subclass__(**kwargs)
+    # only classes that opt in pay for a Python level __reduce_ex__
+    if clazz.__dict__.get('compactPickling'):
+      clazz.__reduce_ex__ = _compactReduce
+      if getattr(clazz, '__setstate__', None) is None: clazz.__setstate__ = _setCompactState
+
+  def __format(self, asRepr, depth, limits):
+    names = tuple(vars(self))
+    formatters = _classCache(self.__class__, '_DataObject__formatters')
+    formatter = formatters.get(names)
+    if formatter is None:
+      if len(formatters) >= MAX_FORMATTERS: formatters.clear()
+      formatter = formatters[names] = _Formatter(self.__class__.__name__, names)
+    return formatter.format(vars(self), asRepr, depth, limits)
+
+# Incremented whenever a constraint is added. Each class keeps the value of the
+# last change of its rules, so compiled plans can be detected as obsolete.
+rulesVersion = 0
+RULES_VERSION = INTERNAL_PREFIX + 'rulesVersion'
+
+def rulesChanged(clazz):
+  '''
+  Make the compiled plans of the class obsolete, and those of its subclasses, that inherit its rules
+  '''
+  global rulesVersion
+  rulesVersion += 1
+  pending = [clazz]
+  while pending:
+    klass = pending.pop()
+    setattr(klass, RULES_VERSION, rulesVersion)
+    pending.extend(klass.__subclasses__())
+
+def currentVersion(clazz):
+  return getattr(clazz, RULES_VERSION, 0)
+
+# Compiled plans kept by a class, one for each set of fields validated
+MAX_PLANS = 256
+
+class Check(object):
+  '''
+  One constraint of one attribute, with its class already resolved
+  '''
+
+  __slots__ = ('attributeName', 'constraintName', 'constraintClass', 'requiredValue', 'cost', 'gating')
+
+  def __init__(self, attributeName, constraintName, requiredValue):
+    self.attributeName = attributeName
+    self.constraintName = constraintName
+    self.constraintClass = validator.ConstraintFactory.getConstraintClass(constraintName)
+    self.requiredValue = requiredValue
+    self.cost = self.constraintClass.cost
+    self.gating = self.constraintClass.gating
+
+  def constraint(self, value):
+    constraint = self.constraintClass()
+    constraint.attributeName = self.attributeName
+    constraint.requiredValue = self.requiredValue
+    constraint.value = value
+    return constraint
+
+class AttributePlan(object):
+  '''
+  Checks of one attribute, cheapest first
+  '''
+
+  __slots__ = ('attributeName', 'path', 'getter', 'checks')
+
+  def __init__(self, attributeName, attrConstraints):
+    self.attributeName = attributeName
+    self.path = tuple(attributeName.split('.'))
+    self.getter = operator.attrgetter(attributeName)
+    checks = [Check(attributeName, constraintName, requiredValue)
+              for constraintName, requiredValue in attrConstraints.items()]
+    # sort is stable: constraints of the same cost keep the order of declaration
+    checks.sort(key=operator.attrgetter('cost'))
+    self.checks = tuple(checks)
+
+  def value(self, obj):
+    try:
+      return self.getter(obj)
+    except AttributeError:
+      raise validator.ConstraintException('Constraint error: Invalid attribute')
+
+class MappingReader(object):
+  '''
+  Reads the values of the attributes from dicts or tuples instead of objects.
+  Missing keys and indices are None.
+  '''
+
+  def __init__(self, columns=None):
+    '''
+    columns: dict of attribute name to key (or index), or list of the attribute names in the order of a tuple
+    '''
+    if isinstance(columns, (list, tuple)):
+      columns = dict((attributeName, index) for index, attributeName in enumerate(columns))
+    self.columns = columns or {}
+
+  def __call__(self, attribute, row):
+    path = attribute.path
+    try:
+      value = row[self.columns.get(path[0], path[0])]
+      for name in path[1:]:
+        value = getattr(value, name) if isinstance(value, DataObject) else value[name]
+    except (KeyError, IndexError, TypeError, AttributeError):
+      return None
+    return value
+
+class CrossCheck(Check):
+  '''
+  One cross constraint. It reads its own value, the tuple of the values of its attributes.
+  '''
+
+  __slots__ = ('attributeNames', 'attributes')
+
+  def __init__(self, name, attributeNames, function, message):
+    self.attributeName = name
+    self.attributeNames = attributeNames
+    self.attributes = tuple(AttributePlan(attributeName, {}) for attributeName in attributeNames)
+    self.constraintName = 'Cross'
+    self.constraintClass = validator.CrossConstraint
+    self.requiredValue = (attributeNames, function, message)
+    self.cost = self.constraintClass.cost
+    self.gating = self.constraintClass.gating
+
+  def value(self, obj, read=AttributePlan.value):
+    return tuple(read(attribute, obj) for attribute in self.attributes)
+
+class ValidationPlan(object):
+  '''
+  Constraints of a class compiled once: constraint classes are resolved and the
+  checks of each attribute run from the cheapest to the most expensive one.
+  When a gating constraint (e.g. Nullable) fails, the other checks of the attribute are skipped.
+  '''
+
+  def __init__(self, clazz, attributes, crossChecks, version):
+    self.clazz = clazz
+    self.attributes = tuple(attributes)
+    self.crossChecks = tuple(crossChecks)
+    self.version = version
+    # constraint classes registered when the plan was compiled, see current
+    self.factoryVersion = validator.ConstraintFactory.version
+    # dependency graph: attribute name -> cross checks that use it
+    self.dependents = {}
+    for cross in self.crossChecks:
+      for attributeName in cross.attributeNames:
+        self.dependents[attributeName] = self.dependents.get(attributeName, ()) + (cross,)
+    # all attributes read by the plan, see snapshot
+    names = [attribute.attributeName for attribute in self.attributes]
+    names.extend(attributeName for attributeName in self.dependents if attributeName not in names)
+    self.names = tuple(names)
+    self.getter = operator.attrgetter(*names) if names else None
+    # results by values of ValueObject.validationCacheSize, it dies with the plan when the rules change
+    self.results = None
+
+  @staticmethod
+  def compile(clazz, constraints, crossConstraints):
+    version = currentVersion(clazz)
+    return ValidationPlan(clazz,
+                          [AttributePlan(attributeName, attrConstraints) for attributeName, attrConstraints in constraints.items()],
+                          [CrossCheck(name, *crossConstraints[name]) for name in crossConstraints],
+                          version)
+
+  def current(self):
+    '''
+    False if a constraint class used by the plan was replaced in the ConstraintFactory.
+    Registering other constraints doesn't make the plan obsolete.
+    '''
+    if self.factoryVersion == validator.ConstraintFactory.version: return True
+    registered = validator.ConstraintFactory.constraintsRules
+    for attribute in self.attributes:
+      for check in attribute.checks:
+        if registered.get(check.constraintName) is not check.constraintClass: return False
+    self.factoryVersion = validator.ConstraintFactory.version
+    return True
+
+  def reads(self, field):
+    '''
+    True if the plan validates the attribute, or one of its dotted attributes, or a cross constraint uses it
+    '''
+    if field in self.names: return True
+    prefix = field + '.'
+    return any(name.startswith(prefix) for name in self.names)
+
+  def restrict(self, fields):
+    '''
+    Plan of only some attributes and the cross constraints that depend on them.
+    A field also selects its dotted attributes, e.g. the field address selects address.street.
+    '''
+    prefixes = tuple(field + '.' for field in fields)
+    selected = lambda attributeName: attributeName in fields or attributeName.startswith(prefixes)
+    crossChecks = set()
+    for attributeName, dependents in self.dependents.items():
+      if selected(attributeName): crossChecks.update(dependents)
+    return ValidationPlan(self.clazz,
+                          [attribute for attribute in self.attributes if selected(attribute.attributeName)],
+                          [cross for cross in self.crossChecks if cross in crossChecks],
+                          self.version)
+
+  def without(self, fields):
+    '''
+    Plan without some attributes (and their dotted attributes) and the cross constraints that read them
+    '''
+    prefixes = tuple(field + '.' for field in fields)
+    excluded = lambda attributeName: attributeName in fields or attributeName.startswith(prefixes)
+    return ValidationPlan(self.clazz,
+                          [attribute for attribute in self.attributes if not excluded(attribute.attributeName)],
+                          [cross for cross in self.crossChecks
+                           if not any(excluded(attributeName) for attributeName in cross.attributeNames)],
+                          self.version)
+
+  def snapshot(self, obj):
+    '''
+    Tuple of the values of all attributes read by the plan
+    '''
+    if self.getter is None: return ()
+    values = self.getter(obj)
+    return values if len(self.names) > 1 else (values,)
+
+  def collect(self, obj, read=AttributePlan.value):
+    '''
+    read(attribute, obj): value of an attribute, e.g. a MappingReader to validate dicts
+    '''
+    errors = []
+    # attributes whose gating constraint failed, their cross constraints are skipped
+    gated = None
+    for attribute in self.attributes:
+      value = read(attribute, obj)
+      if isinstance(value, DataObject):
+        errors.extend(value.collectErrors())
+      for check in attribute.checks:
+        constraint = check.constraint(value)
+        if not constraint.valid():
+          errors.append(constraint.message())
+          if check.gating:
+            if gated is None: gated = set()
+            gated.add(attribute.attributeName)
+            break
+    for cross in self.crossChecks:
+      if gated is not None and not gated.isdisjoint(cross.attributeNames): continue
+      constraint = cross.constraint(cross.value(obj, read))
+      if not constraint.valid():
+        errors.append(constraint.message())
+    return errors
+
+  def collectObserved(self, obj, profiler, read=AttributePlan.value):
+    '''
+    Same as collect, but feeding the profiler and the hooks.
+    The events have the class of the plan, obj may be a dict or a row (see validateMapping).
+    '''
+    clock = profiling.clock
+    started = clock()
+    hooks.dispatch(hooks.BEFORE_VALIDATE, obj, clazz=self.clazz)
+    errors = []
+    gated = set()
+    for attribute in self.attributes:
+      attributeName = attribute.attributeName
+      value = read(attribute, obj)
+      if isinstance(value, DataObject):
+        hooks.dispatch(hooks.NESTED_ENTERED, obj, clazz=self.clazz, attributeName=attributeName, value=value)
+        nestedStarted = clock()
+        innerErrors = value.collectErrors()
+        errors.extend(innerErrors)
+        hooks.dispatch(hooks.NESTED_EXITED, obj, clazz=self.clazz, attributeName=attributeName, value=value, errors=innerErrors,
+                       duration=clock() - nestedStarted)
+      for check in attribute.checks:
+        if not self.__observe(obj, check, value, profiler, errors) and check.gating:
+          gated.add(attributeName)
+          break
+    for cross in self.crossChecks:
+      if gated.isdisjoint(cross.attributeNames):
+        self.__observe(obj, cross, cross.value(obj, read), profiler, errors)
+    duration = clock() - started
+    if profiler is not None:
+      profiler.validated(self.clazz, duration, len(errors) > 0)
+    hooks.dispatch(hooks.AFTER_VALIDATE, obj, clazz=self.clazz, errors=errors, duration=duration)
+    return errors
+
+  def __observe(self, obj, check, value, profiler, errors):
+    '''
+    Run one check feeding the profiler and the hooks, return if it is valid
+    '''
+    constraint = check.constraint(value)
+    started = profiling.clock()
+    if profiler is None:
+      message = None if constraint.valid() else constraint.message()
+    else:
+      message = profiler.check(self.clazz, check.attributeName, check.constraintName, constraint)
+    if message is None: return True
+    errors.append(message)
+    hooks.dispatch(hooks.CONSTRAINT_FAILED, obj, clazz=self.clazz, attributeName=check.attributeName, constraintName=check.constraintName,
+                   constraint=constraint, value=value, message=message, duration=profiling.clock() - started)
+    return False
+
+# Different sets of instance variables of one class that have a cached formatter or pickling schema
+MAX_FORMATTERS = 64
+MAX_SCHEMAS = 64
+
+def _compactReduce(self, protocol):
+  '''
+  __reduce_ex__ of the classes with compactPickling: the values of the variables
+  are pickled in the order of a schema of field names interned by the class.
+  Pickle writes a shared schema only once per stream, instead of the names of
+  the variables of each object, and the internal state of DataObject is not pickled.
+  Classes with their own __getstate__ or __setstate__ are pickled as usual.
+  '''
+  clazz = self.__class__
+  if not clazz.compactPickling or ownState(clazz):
+    return object.__reduce_ex__(self, protocol)
+  return (_restore, (clazz,), packState(self))
+
+def ownState(clazz):
+  '''
+  True if the class defines how its state is pickled, see _compactReduce
+  '''
+  return getattr(clazz, '__getstate__', None) is not getattr(object, '__getstate__', None) or \
+         getattr(clazz, '__setstate__', _setCompactState) is not _setCompactState
+
+def _setCompactState(self, state):
+  '''
+  __setstate__ of the classes with compactPickling, state is (schema, values) or
+  the dict of variables of an object pickled without compactPickling
+  '''
+  if isinstance(state, dict):
+    self.__dict__.update(state)
+  else:
+    fields, values = state
+    self.__dict__.update(zip(fields, values))
+
+def packState(obj):
+  '''
+  (schema, values) of a DataObject: the names of its variables without the internal
+  state, interned by the class, and their values in the same order
+  '''
+  state = vars(obj)
+  names = tuple(state)
+  schemas = _classCache(obj.__class__, '_DataObject__schemas')
+  schema = schemas.get(names)
+  if schema is None:
+    if len(schemas) >= MAX_SCHEMAS: schemas.clear()
+    fields = tuple(name for name in names if not name.startswith(INTERNAL_PREFIX))
+    schema = schemas[names] = (fields, operator.itemgetter(*fields) if len(fields) > 1 else None)
+  fields, getter = schema
+  if getter is not None: return fields, getter(state)
+  return fields, tuple(state[name] for name in fields)
+
+def _restore(clazz):
+  '''
+  Empty object of a class, the variables are set by __setstate__
+  '''
+  return clazz.__new__(clazz)
+
+def _fieldNames(obj):
+  '''
+  Sorted tuple of the names of the variables of an object without the internal state,
+  cached by the class for each set of instance variables
+  '''
+  names = tuple(obj.__dict__)
+  try:
+    return obj.__class__.__dict__['_DataObject__fieldNames'][names]
+  except KeyError:
+    cache = _classCache(obj.__class__, '_DataObject__fieldNames')
+    if len(cache) >= MAX_SCHEMAS: cache.clear()
+    fields = cache[names] = tuple(sorted(name for name in names if not name.startswith(INTERNAL_PREFIX)))
+    return fields
+
+# Last complete validation of the objects of classes with ValueObject.incrementalValidation:
+# id of the object -> (weak reference to the object, plan, values, errors).
+# They are kept outside of the objects, so validating never changes their variables.
+validSnapshots = {}
+
+def _snapshotOf(obj):
+  known = validSnapshots.get(id(obj))
+  if known is None or known[0]() is not obj: return None
+  return known
+
+def _remember(obj, plan, values, errors):
+  key = id(obj)
+  known = validSnapshots.get(key)
+  if known is not None and known[0]() is obj:
+    reference = known[0]
+  else:
+    def forget(reference):
+      if validSnapshots.get(key, (None,))[0] is reference: del validSnapshots[key]
+    reference = weakref.ref(obj, forget)
+  validSnapshots[key] = (reference, plan, values, errors)
+
+def _classCache(clazz, name):
+  '''
+  Dict stored in the class itself, never shared with base classes
+  '''
+  cache = clazz.__dict__.get(name)
+  if cache is None:
+    cache = {}
+    setattr(clazz, name, cache)
+  return cache
+
+class _Formatter(object):
+  '''
+  __str__ and __repr__ of one class and one set of instance variables.
+  Labels are built once, so formatting is a single join over the fields.
+  '''
+
+  def __init__(self, className, names):
+    self.className = className
+    self.fields = sorted(var for var in names if not var.startswith(INTERNAL_PREFIX))
+    self.strLabels = [field + '=(' for field in self.fields]
+    self.reprLabels = [field + '=' for field in self.fields]
+
+  def format(self, values, asRepr, depth, limits):
+    depth += 1
+    if asRepr:
+      return self.className + '(' + ', '.join([label + _render(values[field], True, depth, limits)
+                                               for label, field in zip(self.reprLabels, self.fields)]) + ')'
+    if len(self.fields) == 0: return self.className
+    return self.className + ': ' + ', '.join([label + _render(values[field], False, depth, limits) + ')'
+                                             for label, field in zip(self.strLabels, self.fields)])
+
+CONTAINERS = {list: ('[', ']'), tuple: ('(', ')'), dict: ('{', '}')}
+
+def _render(value, asRepr, depth, limits):
+  '''
+  Text of a value at some depth, respecting limits = (maxItems, maxDepth)
+  '''
+  maxItems, maxDepth = limits
+  if isinstance(value, DataObject):
+    if maxDepth is not None and depth > maxDepth:
+      return value.__class__.__name__ + '(...)'
+    return value._DataObject__format(asRepr, depth, limits)
+  if (maxItems is None and maxDepth is None) or value.__class__ not in CONTAINERS:
+    return repr(value) if asRepr else str(value)
+  opening, closing = CONTAINERS[value.__class__]
+  if maxDepth is not None and depth > maxDepth:
+    return opening + '...' + closing
+  items = value.items() if isinstance(value, dict) else value
+  if maxItems is not None and len(value) > maxItems:
+    items = list(items)[0:maxItems]
+  if isinstance(value, dict):
+    texts = [_render(k, True, depth + 1, limits) + ': ' + _render(v, True, depth + 1, limits) for k, v in items]
+  else:
+    texts = [_render(item, True, depth + 1, limits) for item in items]
+  if len(texts) < len(value):
+    texts.append('...(' + str(len(value) - len(texts)) + ' more)')
+  elif value.__class__ is tuple and len(value) == 1:
+    texts[0] += ','
+  return opening + ', '.join(texts) + closing
+
 
 class Entity(DataObject): 
   '''
@@ -95,13 +725,115 @@ class Entity(DataObject):
   print(example.valid())
   print(example.hasErrors())
   print(example.errors))
+
+  Changes of the variables can be tracked, e.g. to save only the changed columns:
+
+  MyEntity.enableChangeTracking()
+  example = MyEntity()
+  example.commit()
+  example.someint = 2
+  print(example.changes()) # {'someint': (1, 2)}
+  print(example.errors(fields = example.changes()))
+  example.rollback()       # someint is 1 again
+
+  Entities are equal by their identifier, if the class has one:
+
+  class MyEntity(dataobjects.Entity):
+    identifier = 'id'
+
+  MyEntity(id = 1) == MyEntity(id = 1) # True, and they have the same hash
   '''
-  
-#  In the future, this class could have an id property and __eq__ __ne__ methods based
-#  on id property
-#  def __init__(self, id=None):
-#    self.id = id
-  pass
+
+  # Name of the variable that identifies the entities, None means each entity is equal only to itself.
+  # Entities without a value of the identifier (e.g. not saved yet) are also equal only to themselves.
+  identifier = None
+
+  def identity(self):
+    '''
+    Value of the identifier, None if the class or the entity has no identifier
+    '''
+    if self.identifier is None: return None
+    return vars(self).get(self.identifier)
+
+  def __eq__(self, that):
+    if self is that: return True
+    if not isinstance(that, self.__class__) and not isinstance(self, that.__class__): return False
+    identity = self.identity()
+    return identity is not None and identity == that.identity()
+
+  def __ne__(self, that):
+    return not self.__eq__(that)
+
+  def __hash__(self):
+    identity = self.identity()
+    if identity is None: return object.__hash__(self)
+    return hash(identity)
+
+  @classmethod
+  def enableChangeTracking(clazz):
+    '''
+    Record the original value of each variable assigned or deleted after the last commit.
+    Variables starting with _ are not tracked. Only classes that enable it pay for the tracking.
+    '''
+    clazz.__setattr__ = _trackedSetattr
+    clazz.__delattr__ = _trackedDelattr
+
+  @classmethod
+  def tracksChanges(clazz):
+    return clazz.__setattr__ is _trackedSetattr
+
+  def changes(self):
+    '''
+    Dict of variable name to (original value, current value) of the variables
+    changed after the last commit. Variables that didn't exist or were deleted are MISSING.
+    '''
+    self.__checkTracking()
+    changes = {}
+    current = vars(self)
+    for name, original in current.get(JOURNAL, {}).items():
+      value = current.get(name, MISSING)
+      if value is not original and value != original:
+        changes[name] = (original, value)
+    return changes
+
+  def commit(self):
+    '''
+    The current values become the original ones
+    '''
+    self.__checkTracking()
+    vars(self).pop(JOURNAL, None)
+
+  def rollback(self):
+    '''
+    Restore the original values of the changed variables
+    '''
+    self.__checkTracking()
+    state = vars(self)
+    for name, original in state.pop(JOURNAL, {}).items():
+      if original is MISSING:
+        state.pop(name, None)
+      else:
+        state[name] = original
+
+  def __checkTracking(self):
+    if not self.tracksChanges():
+      raise validator.ConstraintException('Change tracking is not enabled for ' + self.__class__.__name__)
+
+def _trackedSetattr(self, name, value):
+  if name[0] != '_':
+    state = self.__dict__
+    journal = state.get(JOURNAL)
+    if journal is None: journal = state[JOURNAL] = {}
+    if name not in journal: journal[name] = state.get(name, MISSING)
+  object.__setattr__(self, name, value)
+
+def _trackedDelattr(self, name):
+  if name[0] != '_':
+    state = self.__dict__
+    journal = state.get(JOURNAL)
+    if journal is None: journal = state[JOURNAL] = {}
+    if name not in journal: journal[name] = state.get(name, MISSING)
+  object.__delattr__(self, name)
 
 class ValueObject(DataObject): 
   '''
@@ -131,23 +863,138 @@ class ValueObject(DataObject):
   print(MyValueObject(3, 4) == MyValueObject(3, 5)) # True
   print(MyValueObject(3, 4).valid()) # True
   print(MyValueObject(2, 5).valid()) # False
+
+  # A copy with some variables changed, sharing the other values.
+  print(MyValueObject(3, 4).evolve(anothervariable = 5).valid()) # False
+
+  # Opt-in: reuse the last validation of each object, only the changed
+  # (or evolved) variables are validated again. See collectErrors.
+  MyValueObject.incrementalValidation = True
   '''
   
+  # Size of the LRU cache of results by values shared by all objects of the class, None means no cache
+  validationCacheSize = None
+  # Reuse the last complete validation of each object, see collectErrors
+  incrementalValidation = False
+
   def equalsVariables(self):
     pass
+
+  @classmethod
+  def validationCache(clazz):
+    '''
+    The LRUCache of results of the current constraints, None if validationCacheSize is None.
+    It is cleared when constraints are added.
+    '''
+    if clazz.validationCacheSize is None: return None
+    plan = clazz.validationPlan()
+    if plan.results is None or plan.results.maxSize != clazz.validationCacheSize:
+      plan.results = LRUCache(clazz.validationCacheSize)
+    return plan.results
+
+  def evolve(self, **changes):
+    '''
+    Copy of this object with some variables changed, without calling __init__.
+    The values of the other variables are shared with this object.
+    '''
+    state = vars(self)
+    for name in changes:
+      if name not in state:
+        raise validator.ConstraintException('Constraint error: Invalid attribute ' + name)
+    clone = self.__class__.__new__(self.__class__)
+    clone.__dict__.update(state)
+    clone.__dict__.pop(INTERNAL_PREFIX + 'currentErrors', None)
+    clone.__dict__.update(changes)
+    if self.incrementalValidation:
+      known = _snapshotOf(self)
+      if known is not None: _remember(clone, *known[1:])
+    return clone
+
+  def collectErrors(self, fields=None, group=None):
+    '''
+    With incrementalValidation, the class remembers the values and the errors of the
+    last complete validation of each object (and evolve copies them to the new object).
+    If it was valid, only the variables assigned after it (and the evolved ones) are validated again.
+    If it was invalid and nothing changed, the same errors are returned.
+    Values are compared by identity: nested DataObjects are always validated again,
+    but changes inside a list or a dict, or in the state read by a Custom function, are not noticed.
+    Without it (the default), every call validates the object again.
+    '''
+    if fields is not None or group is not None or profiling.profiler is not None or hooks.active:
+      return DataObject.collectErrors(self, fields, group)
+    incremental = self.incrementalValidation
+    if not incremental and self.validationCacheSize is None:
+      return DataObject.collectErrors(self)
+    plan = self.validationPlan()
+    try:
+      current = plan.snapshot(self)
+    except AttributeError:
+      return DataObject.collectErrors(self)
+    if not incremental:
+      return self.__cachedErrors(current)
+    known = _snapshotOf(self)
+    if known is None or known[1] is not plan:
+      errors = self.__cachedErrors(current)
+    else:
+      changed = [name for name, old, new in zip(plan.names, known[2], current)
+                 if old is not new or isinstance(new, DataObject)]
+      if not changed: return list(known[3])
+      if known[3]:
+        errors = DataObject.collectErrors(self)
+      else:
+        errors = DataObject.collectErrors(self, changed)
+    _remember(self, plan, current, tuple(errors))
+    return errors
+
+  def __cachedErrors(self, values):
+    '''
+    Errors of a complete validation, from the validation cache if the values were already validated
+    '''
+    cache = self.validationCache()
+    if cache is None: return DataObject.collectErrors(self)
+    for value in values:
+      # nested objects are validated by themselves
+      if isinstance(value, DataObject): return DataObject.collectErrors(self)
+    # the classes are part of the key because 1, 1.0 and True are equal keys
+    key = (values, tuple(map(type, values)))
+    try:
+      found, errors = cache.lookup(key)
+    except TypeError:
+      return DataObject.collectErrors(self)
+    if not found:
+      errors = tuple(DataObject.collectErrors(self))
+      cache.store(key, errors)
+    return list(errors)
+
+  def equalsValues(self):
+    '''
+    Tuple of the values that define the equality of this object
+    '''
+    variables = self.equalsVariables()
+    if variables is None: variables = _fieldNames(self)
+    state = vars(self)
+    return tuple(state[var] for var in variables)
   
   def __eq__(self, that):
     # FIXME: bug with cycle dependency, Example: Player has Team that has lot of Players
     if isinstance(that, self.__class__):
+      if that is self: return True
+      mine, theirs = vars(self), vars(that)
       variables = self.equalsVariables()
       if variables == None:
-          return vars(self) == vars(that)
-      else:
-        for var in variables:
-          if vars(self)[var] != vars(that)[var]:
-            return False
-        return True
+        if mine == theirs: return True
+        # they may differ only in the internal state
+        variables = _fieldNames(self)
+        if variables != _fieldNames(that): return False
+      for var in variables:
+        # values shared by evolve are not compared
+        if mine[var] is not theirs[var] and mine[var] != theirs[var]:
+          return False
+      return True
     return False
+
+  def __hash__(self):
+    return hash(self.equalsValues())
   
   def __ne__(self, that):
     return not self.__eq__(that)
@@ -192,7 +1039,7 @@ class OrderedValueObject(ValueObject):
   '''
 
   def priorityOrder(self):
-    return sorted(vars(self).keys())
+    return self.fields()
   
   def __comparation(self, that, acceptEqual):
     if isinstance(that, self.__class__):
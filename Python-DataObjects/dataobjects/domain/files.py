@@ -0,0 +1,222 @@
+'''
+Validation of big CSV and JSONL files against the constraints of a class.
+
+The file is read in chunks, so the memory used doesn't depend on its size.
+Rows are validated as mappings (see DataObject.validateMapping), no object is created.
+
+from domain import files
+
+stats = files.validateFile('people.csv', Person,
+                           columns={'age': 'AGE'},  # attribute name -> column of the file
+                           types={'age': int},      # CSV values are strings
+                           valid='ok.csv', rejects='rejected.csv', report='errors.jsonl',
+                           processes=4)
+print(stats) # {'rows': ..., 'valid': ..., 'invalid': ..., 'elapsed': ..., 'rowsPerSecond': ...}
+
+The valid and rejected rows are written in the format of the input file. The
+report has one JSON object per rejected row: {"row": 12, "errors": [...]}, with
+rows numbered from 1, not counting the CSV header. Empty CSV values are None.
+
+With processes, the class must be importable by the worker processes, e.g. it
+can't be defined inside a function.
+
+The same from the command line:
+
+python -m domain.files mymodule:Person people.csv --column age=AGE --type age=int \\
+  --valid ok.csv --rejects rejected.csv --report errors.jsonl --processes 4
+
+The statistics are printed as JSON, and the exit status is 1 if some row is invalid.
+'''
+
+import argparse
+import collections
+import csv
+import importlib
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from domain import profiling
+from domain.batch import chunks
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+# Converters of the --type option of the command line
+CONVERTERS = {'int': int, 'float': float, 'str': str}
+
+class FileValidationException(Exception):
+
+  def __init__(self, value):
+    self.value = value
+
+  def __str__(self):
+    return repr(self.value)
+
+
+def formatOf(path):
+  if path.endswith('.csv'): return CSV
+  if path.endswith('.jsonl') or path.endswith('.json'): return JSONL
+  raise FileValidationException('Unknown format of ' + path + ', use format=csv or format=jsonl')
+
+def readRows(source, format):
+  '''
+  Iterator of the rows (dicts) of an open file
+  '''
+  if format == CSV:
+    for row in csv.DictReader(source):
+      yield dict((key, None if value == '' else value) for key, value in row.items())
+  else:
+    for line in source:
+      if line.strip(): yield json.loads(line)
+
+class Sink(object):
+  '''
+  Rows written incrementally in CSV or JSONL
+  '''
+
+  def __init__(self, path, format):
+    self.output = open(path, 'w', newline='') if path is not None else None
+    self.format = format
+    self.writer = None
+
+  def write(self, row):
+    if self.output is None: return
+    if self.format == JSONL:
+      self.output.write(json.dumps(row, sort_keys=True) + '\n')
+      return
+    if self.writer is None:
+      self.writer = csv.DictWriter(self.output, list(row))
+      self.writer.writeheader()
+    self.writer.writerow(row)
+
+  def close(self):
+    if self.output is not None: self.output.close()
+
+def convert(row, columns, types):
+  '''
+  (values, errors, failed): a copy of row with the values of types converted,
+  the errors and the names of the attributes that could not be converted
+  '''
+  if not types: return row, [], []
+  values = dict(row)
+  errors = []
+  failed = []
+  for attributeName, converter in types.items():
+    column = columns.get(attributeName, attributeName)
+    value = values.get(column)
+    if value is None: continue
+    try:
+      values[column] = converter(value)
+    except (TypeError, ValueError):
+      errors.append(attributeName + ' (= ' + str(value) + ') must be convertible by ' + getattr(converter, '__name__', str(converter)))
+      failed.append(attributeName)
+  return values, errors, failed
+
+def validateChunk(clazz, rows, columns, types, group):
+  '''
+  List of the errors of each row. It runs in the worker processes.
+  '''
+  results = []
+  for row in rows:
+    values, errors, failed = convert(row, columns, types)
+    # a column that can't be converted is not validated again by the constraints, the others are
+    results.append(errors + clazz.validateMapping(values, group=group, columns=columns, exclude=failed))
+  return results
+
+def validateFile(path, clazz, columns=None, types=None, valid=None, rejects=None, report=None,
+                 format=None, group=None, chunkSize=10000, processes=None):
+  '''
+  Validate each row of a CSV or JSONL file and return the statistics.
+  columns: dict of attribute name to column (or JSON key)
+  types: dict of attribute name to a function that converts the value read, e.g. int
+  valid, rejects, report: paths of the files to write, None to not write them
+  processes: number of worker processes, None validates in this process
+  '''
+  format = format or formatOf(path)
+  columns = columns or {}
+  stats = {'rows': 0, 'valid': 0, 'invalid': 0, 'chunks': 0}
+  started = profiling.clock()
+  sinks = [Sink(valid, format), Sink(rejects, format), Sink(report, JSONL)]
+  validSink, rejectsSink, reportSink = sinks
+  executor = ProcessPoolExecutor(processes) if processes else None
+  try:
+    with open(path, newline='' if format == CSV else None) as source:
+      for chunk, results in validateChunks(readRows(source, format), clazz, columns, types, group, chunkSize, executor, processes):
+        stats['chunks'] += 1
+        for row, errors in zip(chunk, results):
+          stats['rows'] += 1
+          if errors:
+            stats['invalid'] += 1
+            rejectsSink.write(row)
+            reportSink.write({'row': stats['rows'], 'errors': errors})
+          else:
+            stats['valid'] += 1
+            validSink.write(row)
+  finally:
+    if executor is not None: executor.shutdown(wait=True)
+    for sink in sinks: sink.close()
+  stats['elapsed'] = profiling.clock() - started
+  stats['rowsPerSecond'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+  return stats
+
+def validateChunks(rows, clazz, columns, types, group, chunkSize, executor, processes):
+  '''
+  Iterator of (chunk, errors of each row), in the order of the file.
+  At most two chunks per process are read ahead, so big files are not loaded at once.
+  '''
+  if executor is None:
+    for chunk in chunks(rows, chunkSize):
+      yield chunk, validateChunk(clazz, chunk, columns, types, group)
+    return
+  pending = collections.deque()
+  source = chunks(rows, chunkSize)
+  while True:
+    while len(pending) < 2 * processes:
+      chunk = next(source, None)
+      if chunk is None: break
+      pending.append((chunk, executor.submit(validateChunk, clazz, chunk, columns, types, group)))
+    if not pending: return
+    chunk, future = pending.popleft()
+    yield chunk, future.result()
+
+def load(spec):
+  '''
+  Object of a spec module:name, e.g. mymodule:Person
+  '''
+  if ':' not in spec:
+    raise FileValidationException('Invalid name ' + spec + ', use module:name')
+  moduleName, name = spec.split(':', 1)
+  return getattr(importlib.import_module(moduleName), name)
+
+def pairs(values, option):
+  result = {}
+  for value in values or []:
+    if '=' not in value:
+      raise FileValidationException('Invalid ' + option + ' ' + value + ', use attribute=value')
+    key, value = value.split('=', 1)
+    result[key] = value
+  return result
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description='Validate a CSV or JSONL file against the constraints of a DataObject class')
+  parser.add_argument('clazz', help='class of the rows, as module:Class')
+  parser.add_argument('path', help='CSV or JSONL file')
+  parser.add_argument('--format', choices=[CSV, JSONL], help='format of the file, by default from its extension')
+  parser.add_argument('--column', action='append', help='attribute=column, repeatable')
+  parser.add_argument('--type', action='append', help='attribute=int|float|str|module:function, repeatable')
+  parser.add_argument('--group', help='constraint group')
+  parser.add_argument('--valid', help='file of the valid rows')
+  parser.add_argument('--rejects', help='file of the rejected rows')
+  parser.add_argument('--report', help='JSONL file of the errors of each rejected row')
+  parser.add_argument('--processes', type=int, help='number of worker processes')
+  parser.add_argument('--chunk-size', type=int, default=10000, help='rows validated per task')
+  options = parser.parse_args(args)
+  types = dict((attributeName, CONVERTERS.get(name) or load(name)) for attributeName, name in pairs(options.type, '--type').items())
+  stats = validateFile(options.path, load(options.clazz), columns=pairs(options.column, '--column'), types=types,
+                       valid=options.valid, rejects=options.rejects, report=options.report, format=options.format,
+                       group=options.group, chunkSize=options.chunk_size, processes=options.processes)
+  print(json.dumps(stats))
+  return 1 if stats['invalid'] else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
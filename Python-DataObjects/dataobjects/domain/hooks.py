@@ -0,0 +1,118 @@
+'''
+Callbacks of the validation lifecycle.
+
+from domain import hooks
+
+def trace(event):
+  print(event.name, event.clazz.__name__, event.attributeName, event.constraintName, event.duration)
+
+hooks.addHook(hooks.CONSTRAINT_FAILED, trace)
+...
+hooks.removeHook(hooks.CONSTRAINT_FAILED, trace)
+
+Events and the attributes of the Event received by the callbacks:
+
+BEFORE_VALIDATE: obj, clazz
+AFTER_VALIDATE: obj, clazz, errors, duration (seconds of the whole validation)
+CONSTRAINT_FAILED: obj, clazz, attributeName, constraintName, constraint, value, message, duration (seconds of valid() and message())
+NESTED_ENTERED: obj, clazz, attributeName, value (the inner DataObject)
+NESTED_EXITED: obj, clazz, attributeName, value, errors (of the inner DataObject), duration
+
+The callbacks of each event are kept in a tuple that is rebuilt only when a
+hook is added or removed. While no hook is registered, validation only checks
+the flag active.
+'''
+
+import threading
+
+BEFORE_VALIDATE = 'beforeValidate'
+AFTER_VALIDATE = 'afterValidate'
+CONSTRAINT_FAILED = 'constraintFailed'
+NESTED_ENTERED = 'nestedEntered'
+NESTED_EXITED = 'nestedExited'
+
+EVENTS = (BEFORE_VALIDATE, AFTER_VALIDATE, CONSTRAINT_FAILED, NESTED_ENTERED, NESTED_EXITED)
+
+class HookException(Exception):
+  '''
+  Exception that raises when a hook is registered for an unknown event
+  '''
+
+  def __init__(self, value):
+    '''
+    value: message of this exception
+    '''
+    self.value = value
+
+  def __str__(self):
+    return repr(self.value)
+
+
+class Event(object):
+  '''
+  Context of one event, attributes that don't apply to the event are None
+  '''
+
+  __slots__ = ('name', 'obj', 'clazz', 'attributeName', 'constraintName', 'constraint', 'value',
+               'message', 'errors', 'duration')
+
+  def __init__(self, name, obj, attributeName=None, constraintName=None, constraint=None, value=None,
+               message=None, errors=None, duration=None, clazz=None):
+    '''
+    clazz: the validated class, by default the class of obj
+    '''
+    self.name = name
+    self.obj = obj
+    self.clazz = clazz or obj.__class__
+    self.attributeName = attributeName
+    self.constraintName = constraintName
+    self.constraint = constraint
+    self.value = value
+    self.message = message
+    self.errors = errors
+    self.duration = duration
+
+
+lock = threading.Lock()
+
+# Callbacks of each event, precomputed tuples
+registered = dict((event, ()) for event in EVENTS)
+
+# True if at least one hook is registered
+active = False
+
+def addHook(event, callback):
+  global active
+  if event not in registered:
+    raise HookException('Unknown event ' + str(event))
+  with lock:
+    registered[event] = registered[event] + (callback,)
+    active = True
+
+def removeHook(event, callback):
+  global active
+  if event not in registered:
+    raise HookException('Unknown event ' + str(event))
+  with lock:
+    callbacks = list(registered[event])
+    if callback in callbacks:
+      callbacks.remove(callback)
+    registered[event] = tuple(callbacks)
+    active = any(registered.values())
+
+def clear():
+  global active
+  with lock:
+    for event in EVENTS:
+      registered[event] = ()
+    active = False
+
+def dispatch(name, obj, **context):
+  '''
+  Call the hooks of an event, the Event is created only if there are hooks
+  '''
+  callbacks = registered[name]
+  if callbacks:
+    event = Event(name, obj, **context)
+    for callback in callbacks:
+      callback(event)
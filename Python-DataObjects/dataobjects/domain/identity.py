@@ -0,0 +1,109 @@
+'''
+Identity map: one instance of each entity per session.
+
+from domain import identity
+
+session = identity.IdentityMap()
+customer = session.load(Customer, 10, loadCustomer) # calls loadCustomer(10) only if it isn't in the session
+customer = session.add(Customer(id=10, ...))        # the instance already in the session, if any
+unique = session.dedupe(customersFromManySources)   # one instance of each id, in O(n)
+
+Entities are kept by weak references, so the map doesn't keep alive entities
+that are not used anymore. The class of the entities must have an identifier,
+see Entity.identifier. A session can also be used in a with block, that clears
+the map at the end.
+'''
+
+import threading
+import weakref
+
+class IdentityMapException(Exception):
+
+  def __init__(self, value):
+    self.value = value
+
+  def __str__(self):
+    return repr(self.value)
+
+
+class IdentityMap(object):
+
+  def __init__(self):
+    self.entities = weakref.WeakValueDictionary()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def key(self, clazz, identity):
+    if clazz.identifier is None:
+      raise IdentityMapException(clazz.__name__ + ' has no identifier')
+    if identity is None:
+      raise IdentityMapException('Entities of ' + clazz.__name__ + ' without ' + clazz.identifier + ' have no identity')
+    return (clazz, identity)
+
+  def get(self, clazz, identity):
+    '''
+    The entity of the session with this identity, None if there is no one
+    '''
+    entity = self.entities.get(self.key(clazz, identity))
+    if entity is None: self.misses += 1
+    else: self.hits += 1
+    return entity
+
+  def add(self, entity):
+    '''
+    Add an entity and return the instance of the session with its identity:
+    the entity itself or the one added before
+    '''
+    key = self.key(entity.__class__, entity.identity())
+    with self.lock:
+      current = self.entities.get(key)
+      if current is not None:
+        self.hits += 1
+        return current
+      self.misses += 1
+      self.entities[key] = entity
+      return entity
+
+  def load(self, clazz, identity, loader):
+    '''
+    The entity of the session with this identity or, if there is no one, loader(identity) added to the session
+    '''
+    entity = self.get(clazz, identity)
+    if entity is None:
+      entity = loader(identity)
+      if entity is not None: entity = self.add(entity)
+    return entity
+
+  def dedupe(self, entities):
+    '''
+    List with one instance of each identity, in the order of their first occurrence
+    '''
+    result = []
+    seen = set()
+    for entity in entities:
+      entity = self.add(entity)
+      if id(entity) not in seen:
+        seen.add(id(entity))
+        result.append(entity)
+    return result
+
+  def remove(self, entity):
+    with self.lock:
+      self.entities.pop(self.key(entity.__class__, entity.identity()), None)
+
+  def __contains__(self, entity):
+    return self.entities.get(self.key(entity.__class__, entity.identity())) is entity
+
+  def __len__(self):
+    return len(self.entities)
+
+  def clear(self):
+    with self.lock:
+      self.entities.clear()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.clear()
@@ -0,0 +1,109 @@
+'''
+Flyweights of ValueObjects: equal objects are replaced by one shared instance.
+
+from domain import interning
+
+money = interning.internerFor(Money)
+price = money('BRL', 10) # the same object of any other money('BRL', 10) alive
+price.valid()            # validated once for all of them if Money.incrementalValidation,
+                         # see ValueObject.collectErrors
+print(money.stats())     # {'size': ..., 'hits': ..., 'misses': ..., 'bytesSaved': ...}
+
+Objects share one instance only if all their variables (see fields()) have equal
+values of the same classes, so Money('BRL', 1) and Money('BRL', 1.0) don't, and
+neither do objects that are equal by equalsVariables but differ in other variables.
+Objects whose values are not hashable (e.g. lists) are not interned.
+
+Canonical objects are kept by weak references: they are discarded when no one
+else uses them. Interned objects must not be changed, since they are shared.
+'''
+
+import sys
+import threading
+import weakref
+
+class Interner(object):
+  '''
+  Factory of canonical objects of one ValueObject class
+  '''
+
+  def __init__(self, clazz):
+    self.clazz = clazz
+    self.pool = weakref.WeakValueDictionary()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.uncacheable = 0
+    self.bytesSaved = 0
+
+  def __call__(self, *args, **kwargs):
+    '''
+    Create an object and return the canonical one equal to it
+    '''
+    return self.intern(self.clazz(*args, **kwargs))
+
+  def intern(self, obj):
+    try:
+      names = tuple(obj.fields())
+      state = vars(obj)
+      values = tuple(state[name] for name in names)
+      # the classes are part of the key because 1, 1.0 and True are equal keys
+      key = (names, values, tuple(map(type, values)))
+      hash(key)
+    except TypeError:
+      self.uncacheable += 1
+      return obj
+    with self.lock:
+      canonical = self.pool.get(key)
+      if canonical is not None:
+        self.hits += 1
+        self.bytesSaved += sizeOf(obj)
+        return canonical
+      self.misses += 1
+      self.pool[key] = obj
+    # validated once, the next validations of the shared object reuse the result
+    if getattr(self.clazz, 'incrementalValidation', False): obj.collectErrors()
+    return obj
+
+  def __len__(self):
+    return len(self.pool)
+
+  def hitRate(self):
+    total = self.hits + self.misses
+    return self.hits / float(total) if total else 0.0
+
+  def stats(self):
+    '''
+    bytesSaved is an estimate: the size of each discarded duplicate and its dict of variables
+    '''
+    return {
+      'size': len(self.pool),
+      'hits': self.hits,
+      'misses': self.misses,
+      'uncacheable': self.uncacheable,
+      'hitRate': self.hitRate(),
+      'bytesSaved': self.bytesSaved,
+    }
+
+  def clear(self):
+    with self.lock:
+      self.pool.clear()
+
+def sizeOf(obj):
+  return sys.getsizeof(obj) + sys.getsizeof(vars(obj))
+
+
+interners = weakref.WeakKeyDictionary()
+internersLock = threading.Lock()
+
+def internerFor(clazz):
+  '''
+  The Interner shared by all users of a class
+  '''
+  interner = interners.get(clazz)
+  if interner is None:
+    with internersLock:
+      interner = interners.get(clazz)
+      if interner is None:
+        interner = interners[clazz] = Interner(clazz)
+  return interner
@@ -0,0 +1,120 @@
+'''
+On demand memory diagnostics of DataObjects.
+
+from domain import memory
+
+for row in memory.liveInstances():
+  print(row) # {'class': 'Customer', 'instances': 12000, 'size': 2304000, 'retained': 3110000}
+
+for row in memory.constraintAllocations(sampleCustomer):
+  print(row) # {'attribute': 'email', 'constraint': 'Email', 'peak': 1200, 'retained': 0}
+
+with memory.tracking() as usage:
+  validator.validate(customers)
+print(usage.peak, usage.retained)
+
+Nothing is measured while these functions are not running: tracemalloc is
+started only inside them (and stopped after, unless it was already running) and
+the live instances are found by walking the objects of the garbage collector.
+'''
+
+import gc
+import sys
+import tracemalloc
+from domain.dataobjects import DataObject
+
+def shallowSize(obj):
+  '''
+  Bytes of an object and its dict of variables
+  '''
+  size = sys.getsizeof(obj)
+  state = getattr(obj, '__dict__', None)
+  if state is not None: size += sys.getsizeof(state)
+  return size
+
+def liveInstances(root=DataObject):
+  '''
+  Instances alive of each subclass of root, largest classes first.
+  size is the bytes of the objects and their dicts. retained also counts the
+  values of their variables that are not DataObjects, without going into containers.
+  '''
+  rows = {}
+  for obj in gc.get_objects():
+    if not isinstance(obj, root): continue
+    clazz = obj.__class__
+    row = rows.get(clazz)
+    if row is None:
+      row = rows[clazz] = {'class': clazz.__name__, 'module': clazz.__module__, 'instances': 0, 'size': 0, 'retained': 0}
+    size = shallowSize(obj)
+    row['instances'] += 1
+    row['size'] += size
+    row['retained'] += size + sum(sys.getsizeof(value) for value in vars(obj).values() if not isinstance(value, DataObject))
+  return sorted(rows.values(), key=lambda row: -row['retained'])
+
+class Usage(object):
+  '''
+  Memory used by a block: peak is the highest number of bytes allocated at the
+  same time, retained is the number of bytes still allocated at the end
+  '''
+
+  def __init__(self):
+    self.peak = 0
+    self.retained = 0
+
+class tracking(object):
+  '''
+  with tracking() as usage: measure the memory allocated by the block
+  '''
+
+  def __enter__(self):
+    self.wasTracing = tracemalloc.is_tracing()
+    if not self.wasTracing: tracemalloc.start()
+    tracemalloc.reset_peak()
+    self.start = tracemalloc.get_traced_memory()[0]
+    self.usage = Usage()
+    return self.usage
+
+  def __exit__(self, *exc):
+    current, peak = tracemalloc.get_traced_memory()
+    if not self.wasTracing: tracemalloc.stop()
+    self.usage.peak = max(0, peak - self.start)
+    self.usage.retained = current - self.start
+
+def measure(function, *args, **kwargs):
+  '''
+  (result of function, Usage of the call), e.g. for the peak memory of a batch operation
+  '''
+  with tracking() as usage:
+    result = function(*args, **kwargs)
+  return result, usage
+
+def constraintAllocations(obj, repeat=10):
+  '''
+  Bytes allocated by each constraint when validating obj, the most expensive first.
+  peak and retained are averages of repeat evaluations of each constraint.
+  The last row (attribute and constraint None) is a whole validation of obj, without
+  the caches of ValueObject (so each repetition really validates).
+  '''
+  plan = obj.validationPlan()
+  checks = [(attribute, check) for attribute in plan.attributes for check in attribute.checks]
+  checks.extend((cross, cross) for cross in plan.crossChecks)
+  rows = []
+  for attribute, check in checks:
+    value = attribute.value(obj)
+    peak = retained = 0
+    for i in range(repeat):
+      with tracking() as usage:
+        constraint = check.constraint(value)
+        if not constraint.valid(): constraint.message()
+        del constraint
+      peak += usage.peak
+      retained += usage.retained
+    rows.append({'attribute': check.attributeName, 'constraint': check.constraintName,
+                 'peak': peak // repeat, 'retained': retained // repeat})
+  rows.sort(key=lambda row: -row['peak'])
+  peak = 0
+  for i in range(repeat):
+    errors, usage = measure(DataObject.collectErrors, obj)
+    peak += usage.peak
+  rows.append({'attribute': None, 'constraint': None, 'peak': peak // repeat, 'retained': 0})
+  return rows
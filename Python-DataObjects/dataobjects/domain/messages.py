@@ -0,0 +1,144 @@
+'''
+Catalog of the messages of the constraints, in English (the default), Portuguese and Spanish.
+
+Messages are keyed by constraint name and variant, e.g. ('Min', 'length') for
+lists and strings and ('Min', 'value') for numbers. Their templates use the
+string.Template syntax and are compiled once, so formatting a message is just
+a lookup and a % operation.
+
+from domain import messages
+
+messages.setLocale('pt')         # for the current thread
+with messages.locale('es'):      # only inside the block
+  print(obj.errors())
+messages.setDefaultLocale('pt')  # for the threads without a locale
+
+# New translations or constraints, missing ones fall back to English
+messages.register('fr', 'Min', 'value', '$attr (= $value) doit etre superieur ou egal a $required')
+'''
+
+import re
+import threading
+from contextlib import contextmanager
+
+DEFAULT_VARIANT = 'default'
+ENGLISH = 'en'
+
+CATALOGS = {
+  'en': {
+    ('Min', 'length'): '$attr (= $value) must have length greater or equal than $required',
+    ('Min', 'value'): '$attr (= $value) must be greater or equal than $required',
+    ('Max', 'length'): '$attr (= $value) must have length lower or equal than $required',
+    ('Max', 'value'): '$attr (= $value) must be lower or equal than $required',
+    ('Nullable', 'default'): '$attr (= $value) must be different of None',
+    ('Matches', 'default'): '$attr (= $value) must matches $required',
+    ('InList', 'default'): '$attr (= $value) must be in list $required',
+    ('Scale', 'default'): '$attr (= $value) must have $required decimals or less',
+    ('Email', 'default'): '$attr (= $value) must be a valid e-mail address',
+    ('IP', 'default'): '$attr (= $value) must be a valid ip address',
+    ('Site', 'default'): '$attr (= $value) must be a valid site address',
+    ('Custom', 'default'): '$attr (= $value) must be satisfied by specific function',
+    ('Each', 'type'): '$attr (= $value) must be a list, tuple or dict',
+    ('Each', 'collected'): '$attr has $count invalid elements at [$indices]: $first',
+    ('EachKey', 'type'): '$attr (= $value) must be a dict',
+    ('Cross', 'default'): '$attrs (= $values) must satisfy $name',
+  },
+  'pt': {
+    ('Min', 'length'): '$attr (= $value) deve ter tamanho maior ou igual a $required',
+    ('Min', 'value'): '$attr (= $value) deve ser maior ou igual a $required',
+    ('Max', 'length'): '$attr (= $value) deve ter tamanho menor ou igual a $required',
+    ('Max', 'value'): '$attr (= $value) deve ser menor ou igual a $required',
+    ('Nullable', 'default'): '$attr (= $value) deve ser diferente de None',
+    ('Matches', 'default'): '$attr (= $value) deve corresponder a $required',
+    ('InList', 'default'): '$attr (= $value) deve estar na lista $required',
+    ('Scale', 'default'): '$attr (= $value) deve ter $required casas decimais ou menos',
+    ('Email', 'default'): '$attr (= $value) deve ser um endereço de e-mail válido',
+    ('IP', 'default'): '$attr (= $value) deve ser um endereço ip válido',
+    ('Site', 'default'): '$attr (= $value) deve ser um endereço de site válido',
+    ('Custom', 'default'): '$attr (= $value) deve satisfazer a função específica',
+    ('Each', 'type'): '$attr (= $value) deve ser uma lista, tupla ou dicionário',
+    ('Each', 'collected'): '$attr tem $count elementos inválidos em [$indices]: $first',
+    ('EachKey', 'type'): '$attr (= $value) deve ser um dicionário',
+    ('Cross', 'default'): '$attrs (= $values) devem satisfazer $name',
+  },
+  'es': {
+    ('Min', 'length'): '$attr (= $value) debe tener longitud mayor o igual que $required',
+    ('Min', 'value'): '$attr (= $value) debe ser mayor o igual que $required',
+    ('Max', 'length'): '$attr (= $value) debe tener longitud menor o igual que $required',
+    ('Max', 'value'): '$attr (= $value) debe ser menor o igual que $required',
+    ('Nullable', 'default'): '$attr (= $value) debe ser distinto de None',
+    ('Matches', 'default'): '$attr (= $value) debe coincidir con $required',
+    ('InList', 'default'): '$attr (= $value) debe estar en la lista $required',
+    ('Scale', 'default'): '$attr (= $value) debe tener $required decimales o menos',
+    ('Email', 'default'): '$attr (= $value) debe ser una dirección de correo electrónico válida',
+    ('IP', 'default'): '$attr (= $value) debe ser una dirección ip válida',
+    ('Site', 'default'): '$attr (= $value) debe ser una dirección de sitio válida',
+    ('Custom', 'default'): '$attr (= $value) debe satisfacer la función específica',
+    ('Each', 'type'): '$attr (= $value) debe ser una lista, tupla o diccionario',
+    ('Each', 'collected'): '$attr tiene $count elementos inválidos en [$indices]: $first',
+    ('EachKey', 'type'): '$attr (= $value) debe ser un diccionario',
+    ('Cross', 'default'): '$attrs (= $values) deben satisfacer $name',
+  },
+}
+
+PLACEHOLDER = re.compile(r'\$(?:(\$)|(\w+)|\{(\w+)\})')
+
+def compileTemplate(template):
+  '''
+  % format equivalent to a string.Template, e.g. '$attr (= $value)' -> '%(attr)s (= %(value)s)'
+  '''
+  def replace(match):
+    if match.group(1): return '$'
+    return '%(' + (match.group(2) or match.group(3)) + ')s'
+  return PLACEHOLDER.sub(replace, template.replace('%', '%%'))
+
+compiled = {}
+defaultLocale = ENGLISH
+state = threading.local()
+
+def register(localeName, constraintName, variant, template):
+  '''
+  Add or replace the template of a message
+  '''
+  compiled.setdefault(localeName, {})[(constraintName, variant)] = compileTemplate(template)
+
+for localeName, catalog in CATALOGS.items():
+  for (constraintName, variant), template in catalog.items():
+    register(localeName, constraintName, variant, template)
+
+def currentLocale():
+  return getattr(state, 'locale', None) or defaultLocale
+
+def setLocale(localeName):
+  '''
+  Locale of the current thread, None means the default locale
+  '''
+  state.locale = localeName
+
+def setDefaultLocale(localeName):
+  global defaultLocale
+  defaultLocale = localeName
+
+@contextmanager
+def locale(localeName):
+  '''
+  Use a locale in the current thread inside a with block
+  '''
+  previous = getattr(state, 'locale', None)
+  state.locale = localeName
+  try:
+    yield
+  finally:
+    state.locale = previous
+
+def formatter(constraintName, variant=DEFAULT_VARIANT, localeName=None):
+  '''
+  Compiled % format of a message, in English if there is no translation
+  '''
+  key = (constraintName, variant)
+  catalog = compiled.get(localeName or currentLocale())
+  if catalog is not None and key in catalog: return catalog[key]
+  return compiled[ENGLISH][key]
+
+def format(constraintName, variant=DEFAULT_VARIANT, **values):
+  return formatter(constraintName, variant) % values
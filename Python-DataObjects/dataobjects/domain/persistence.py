@@ -0,0 +1,219 @@
+'''
+Bulk persistence of validated DataObjects in SQLite.
+
+from domain import persistence
+
+store = persistence.SQLiteStore('staging.db', Customer, checks=True)
+result = store.insert(customers, chunkSize=1000)
+print(result.inserted, len(result.rejected), result.rowsPerSecond)
+for obj, errors in result.rejected:
+  ...
+
+for customer in store.select('balance > ?', (100,)):
+  ... # built lazily from the rows, without calling __init__
+
+The table (by default, the name of the class) is created on the first insert:
+one column for each field of the first object, typed by the values of the first
+chunk. The identifier of an Entity (see Entity.identifier) is the primary key.
+With checks, Nullable = False becomes NOT NULL and Min, Max and InList become
+CHECK constraints of the columns, so other writers are also validated.
+
+Each chunk is validated with the constraints of the class and its valid objects
+are inserted with executemany in one transaction. If the database refuses a
+row (e.g. a duplicated identifier), the chunk is inserted again row by row and
+the refused objects are rejected with the message of the database.
+'''
+
+import sqlite3
+from domain import profiling
+from domain.batch import chunks
+from domain.storage import typeOf
+
+# SQLite stores BOOLEAN as integers, the declared type tells select to return bools
+SQL_TYPES = {'int': 'INTEGER', 'float': 'REAL', 'str': 'TEXT', 'bool': 'BOOLEAN'}
+
+class PersistenceException(Exception):
+
+  def __init__(self, value):
+    self.value = value
+
+  def __str__(self):
+    return repr(self.value)
+
+
+def quote(name):
+  return '"' + name.replace('"', '""') + '"'
+
+def literal(value):
+  '''
+  SQL text of a constant of a CHECK constraint, DDL doesn't accept parameters
+  '''
+  if isinstance(value, bool): return str(int(value))
+  if isinstance(value, (int, float)): return repr(value)
+  if isinstance(value, str): return "'" + value.replace("'", "''") + "'"
+  raise PersistenceException('Unsupported value in a check: ' + repr(value))
+
+def checksOf(column, fieldType, attrConstraints):
+  '''
+  SQL constraints of a column equivalent to Nullable, Min, Max and InList
+  '''
+  checks = []
+  if attrConstraints.get('Nullable') is False:
+    checks.append('NOT NULL')
+  # Min and Max of strings are about their length
+  measure = 'length(' + quote(column) + ')' if fieldType == 'str' else quote(column)
+  for name, operator in (('Min', '>='), ('Max', '<=')):
+    if isinstance(attrConstraints.get(name), (int, float)):
+      checks.append('CHECK (' + measure + ' ' + operator + ' ' + literal(attrConstraints[name]) + ')')
+  if isinstance(attrConstraints.get('InList'), (list, tuple)) and attrConstraints['InList']:
+    try:
+      values = ', '.join(literal(value) for value in attrConstraints['InList'])
+    except PersistenceException:
+      return checks
+    checks.append('CHECK (' + quote(column) + ' IN (' + values + '))')
+  return checks
+
+class InsertResult(object):
+
+  def __init__(self):
+    self.inserted = 0
+    self.rejected = []
+    self.chunks = 0
+    self.elapsed = 0.0
+
+  @property
+  def rowsPerSecond(self):
+    return self.inserted / self.elapsed if self.elapsed > 0 else 0.0
+
+class SQLiteStore(object):
+
+  def __init__(self, database, clazz, table=None, checks=False, group=None):
+    '''
+    database: path of the database or an open sqlite3 connection
+    checks: add NOT NULL and CHECK constraints derived from the constraints of the class (of the group)
+    group: constraint group used to validate the objects
+    '''
+    self.connection = database if isinstance(database, sqlite3.Connection) else sqlite3.connect(database)
+    self.clazz = clazz
+    self.table = table or clazz.__name__
+    self.checks = checks
+    self.group = group
+    self.fields = None
+    self.types = None
+    self.__loadLayout()
+
+  def __loadLayout(self):
+    '''
+    Fields and types of an existing table
+    '''
+    rows = self.connection.execute('PRAGMA table_info(' + quote(self.table) + ')').fetchall()
+    if not rows: return
+    self.fields = [row[1] for row in rows]
+    declared = dict((sqlType, fieldType) for fieldType, sqlType in SQL_TYPES.items())
+    self.types = [declared.get(row[2], 'str') for row in rows]
+
+  def createTable(self, objects):
+    '''
+    Create the table for objects like these, if it doesn't exist
+    '''
+    if self.fields is not None: return
+    # the rules of the group the objects are validated with
+    constraints = self.clazz.groupConstraints(self.group)[0]
+    fields = objects[0].fields() if objects else sorted(constraints)
+    types = [typeOf(field, [vars(obj).get(field) for obj in objects]) for field in fields]
+    identifier = getattr(self.clazz, 'identifier', None)
+    columns = []
+    for field, fieldType in zip(fields, types):
+      column = quote(field) + ' ' + SQL_TYPES[fieldType]
+      if field == identifier: column += ' PRIMARY KEY'
+      if self.checks:
+        column = ' '.join([column] + checksOf(field, fieldType, constraints.get(field, {})))
+      columns.append(column)
+    with self.connection:
+      self.connection.execute('CREATE TABLE IF NOT EXISTS ' + quote(self.table) + ' (' + ', '.join(columns) + ')')
+    self.fields = fields
+    self.types = types
+
+  def insert(self, objects, chunkSize=1000):
+    '''
+    Validate and insert the valid objects, one transaction per chunk. Return an InsertResult.
+    Objects refused by the database (e.g. a duplicated identifier) are rejected with its error message.
+    '''
+    result = InsertResult()
+    started = profiling.clock()
+    statement = None
+    for chunk in chunks(objects, chunkSize):
+      self.createTable(chunk)
+      if statement is None:
+        statement = 'INSERT INTO ' + quote(self.table) + ' (' + ', '.join(quote(field) for field in self.fields) + \
+                    ') VALUES (' + ', '.join('?' * len(self.fields)) + ')'
+      rows = []
+      accepted = []
+      for obj in chunk:
+        errors = obj.collectErrors(group=self.group)
+        if errors:
+          result.rejected.append((obj, errors))
+        else:
+          values = vars(obj)
+          rows.append(tuple(values.get(field) for field in self.fields))
+          accepted.append(obj)
+      try:
+        with self.connection:
+          self.connection.executemany(statement, rows)
+        result.inserted += len(rows)
+      except sqlite3.IntegrityError:
+        # the chunk was rolled back, insert it again row by row to find the refused ones
+        result.inserted += self.__insertEach(statement, accepted, rows, result)
+      result.chunks += 1
+    result.elapsed = profiling.clock() - started
+    return result
+
+  def __insertEach(self, statement, objects, rows, result):
+    '''
+    Insert the rows one by one in one transaction, rejecting the ones that violate a constraint of the table
+    '''
+    inserted = 0
+    with self.connection:
+      for obj, row in zip(objects, rows):
+        try:
+          self.connection.execute(statement, row)
+          inserted += 1
+        except sqlite3.IntegrityError as error:
+          result.rejected.append((obj, [str(error)]))
+    return inserted
+
+  def select(self, where=None, parameters=(), chunkSize=1000):
+    '''
+    Iterator of the objects of the table, built without calling __init__ while the rows are read
+    '''
+    if self.fields is None: return
+    query = 'SELECT ' + ', '.join(quote(field) for field in self.fields) + ' FROM ' + quote(self.table)
+    if where: query += ' WHERE ' + where
+    cursor = self.connection.execute(query, parameters)
+    fields = self.fields
+    clazz = self.clazz
+    # SQLite stores bool values as integers
+    bools = [field for field, fieldType in zip(fields, self.types) if fieldType == 'bool']
+    while True:
+      rows = cursor.fetchmany(chunkSize)
+      if not rows: return
+      for row in rows:
+        obj = clazz.__new__(clazz)
+        values = obj.__dict__
+        values.update(zip(fields, row))
+        for field in bools:
+          if values[field] is not None: values[field] = bool(values[field])
+        yield obj
+
+  def count(self):
+    if self.fields is None: return 0
+    return self.connection.execute('SELECT COUNT(*) FROM ' + quote(self.table)).fetchone()[0]
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
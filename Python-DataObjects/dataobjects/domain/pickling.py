@@ -0,0 +1,76 @@
+'''
+Compact pickling of collections of DataObjects of the same class, e.g. to send
+them to a pool of processes.
+
+from domain import pickling
+
+data = pickling.dumps(customers)   # the class and the field names are written once
+customers = pickling.loads(data)   # a list of Customer
+
+# or inside other pickled data, Batch is unpickled as a list
+executor.submit(work, pickling.Batch(customers))
+
+Each object is written as a tuple of the values of its variables, in the order
+of a schema of field names (see domain.dataobjects.packState). The objects are
+created without calling __init__. Objects of a batch can't reference each other
+in a cycle, pickle each object by itself for that. Objects of classes with their
+own __getstate__ or __setstate__ are pickled as a plain list.
+'''
+
+import pickle
+from domain.dataobjects import ownState, packState
+
+class Batch(object):
+  '''
+  List of objects of one class that is pickled as (class, schemas, rows)
+  '''
+
+  def __init__(self, objects):
+    self.objects = list(objects)
+
+  def __reduce__(self):
+    if not self.objects:
+      return (list, ())
+    clazz = self.objects[0].__class__
+    if ownState(clazz):
+      return (list, (self.objects,))
+    schemas = []
+    positions = {}
+    indexes = []
+    rows = []
+    for obj in self.objects:
+      if obj.__class__ is not clazz:
+        raise pickle.PicklingError('All objects of a batch must be instances of ' + clazz.__name__)
+      fields, values = packState(obj)
+      position = positions.get(fields)
+      if position is None:
+        position = positions[fields] = len(schemas)
+        schemas.append(fields)
+      indexes.append(position)
+      rows.append(values)
+    # most batches have a single schema
+    if len(schemas) == 1: indexes = None
+    return (unpack, (clazz, tuple(schemas), indexes, rows))
+
+def unpack(clazz, schemas, indexes, rows):
+  new = clazz.__new__
+  objects = []
+  append = objects.append
+  if indexes is None:
+    fields = schemas[0]
+    for values in rows:
+      obj = new(clazz)
+      obj.__dict__.update(zip(fields, values))
+      append(obj)
+  else:
+    for index, values in zip(indexes, rows):
+      obj = new(clazz)
+      obj.__dict__.update(zip(schemas[index], values))
+      append(obj)
+  return objects
+
+def dumps(objects, protocol=pickle.HIGHEST_PROTOCOL):
+  return pickle.dumps(Batch(objects), protocol)
+
+def loads(data):
+  return pickle.loads(data)
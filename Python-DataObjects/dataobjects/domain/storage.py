@@ -0,0 +1,334 @@
+'''
+Compact binary storage for collections of ValueObjects.
+
+Layout of a file:
+
+  magic (8 bytes) | header length (uint32) | header (JSON, utf-8) | padding
+  records: one fixed-width record per object
+  strings: utf-8 heap referenced by (offset, length) slots of the records
+
+Each record starts with a bitmap of None values, followed by one slot per field:
+int and float fields are stored in 8 bytes, bool in 1 byte and str as an
+(offset, length) pair inside the strings heap.
+
+The file is opened through mmap and nothing is decoded until it is touched:
+
+from domain import storage
+
+storage.write('money.pdo', moneys)
+
+with storage.MappedCollection('money.pdo', Money) as collection:
+  print(len(collection))
+  print(collection.view(10).amount) # decodes only one field
+  print(collection[10]) # decodes one Money
+
+The header stores the fields schema and a fingerprint of the constraints of the
+class, so opening a file with a class whose rules changed raises a StorageException.
+'''
+
+import datetime
+import decimal
+import fractions
+import hashlib
+import json
+import mmap
+import re
+import struct
+
+MAGIC = b'PDOVO\x00\x01\x00'
+HEADER_LENGTH = struct.Struct('<I')
+
+SLOTS = {
+  'int': 'q',
+  'float': 'd',
+  'bool': '?',
+  'str': 'QI',
+}
+
+EMPTY = {
+  'int': 0,
+  'float': 0.0,
+  'bool': False,
+  'str': '',
+}
+
+class StorageException(Exception):
+  '''
+  Exception that raises when a collection can not be written or read
+  '''
+
+  def __init__(self, value):
+    '''
+    value: message of this exception
+    '''
+    self.value = value
+
+  def __str__(self):
+    return repr(self.value)
+
+
+def className(clazz):
+  return clazz.__module__ + '.' + clazz.__name__
+
+# Values whose repr is the same in every process
+STABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, decimal.Decimal, fractions.Fraction,
+                datetime.date, datetime.time, datetime.timedelta)
+
+def describe(requiredValue):
+  '''
+  Text of a required value that is the same in every process, so the fingerprint
+  doesn't depend on the hash seed or on memory addresses: the elements of sets and
+  dicts are sorted and functions are identified by their names.
+  Other objects have no stable description and raise a StorageException.
+  '''
+  if isinstance(requiredValue, STABLE_TYPES):
+    return repr(requiredValue)
+  if isinstance(requiredValue, list):
+    return '[' + ', '.join(describe(value) for value in requiredValue) + ']'
+  if isinstance(requiredValue, tuple):
+    return '(' + ', '.join(describe(value) for value in requiredValue) + (',)' if len(requiredValue) == 1 else ')')
+  if isinstance(requiredValue, (set, frozenset)):
+    return requiredValue.__class__.__name__ + '({' + ', '.join(sorted(describe(value) for value in requiredValue)) + '})'
+  if isinstance(requiredValue, dict):
+    return '{' + ', '.join(sorted(describe(key) + ': ' + describe(value) for key, value in requiredValue.items())) + '}'
+  if isinstance(requiredValue, re.Pattern):
+    return 're.compile(' + repr(requiredValue.pattern) + ', ' + str(int(requiredValue.flags)) + ')'
+  if callable(requiredValue) and hasattr(requiredValue, '__qualname__'):
+    return getattr(requiredValue, '__module__', '') + '.' + requiredValue.__qualname__
+  raise StorageException('Constraint value without a stable description: ' + repr(requiredValue))
+
+def describeRules(constraints, crossConstraints, prefix=''):
+  '''
+  One line of text for each constraint and cross constraint, sorted
+  '''
+  rules = []
+  for attributeName in sorted(constraints):
+    attrConstraints = constraints[attributeName]
+    for constraintName in sorted(attrConstraints):
+      rules.append(prefix + attributeName + ':' + constraintName + '=' + describe(attrConstraints[constraintName]))
+  for name in sorted(crossConstraints):
+    attributeNames, function, message = crossConstraints[name]
+    rules.append(prefix + name + ':Cross=' + ','.join(attributeNames) + ':' + describe(function) + ':' + describe(message))
+  return rules
+
+def fingerprint(clazz):
+  '''
+  Hash of all constraints of the class, including the cross constraints and the
+  constraints of each group (merged through the base classes)
+  '''
+  rules = describeRules(clazz.constraints, clazz.crossConstraints)
+  for group in clazz.groups():
+    rules.extend(describeRules(*clazz.groupConstraints(group), prefix='[' + str(group) + ']'))
+  return hashlib.sha1('\n'.join(rules).encode('utf-8')).hexdigest()
+
+def typeOf(fieldName, values):
+  fieldType = None
+  for value in values:
+    if value is None: continue
+    if isinstance(value, bool): name = 'bool'
+    elif isinstance(value, int): name = 'int'
+    elif isinstance(value, float): name = 'float'
+    elif isinstance(value, str): name = 'str'
+    else:
+      raise StorageException('Field ' + fieldName + ' has an unsupported type: ' + value.__class__.__name__)
+    if fieldType is None or (fieldType, name) == ('int', 'float'): fieldType = name
+    elif fieldType != name and (fieldType, name) != ('float', 'int'):
+      raise StorageException('Field ' + fieldName + ' mixes ' + fieldType + ' and ' + name + ' values')
+  return fieldType or 'str'
+
+def bitmapSize(types):
+  return (len(types) + 7) // 8
+
+def recordStruct(types):
+  return struct.Struct('<' + str(bitmapSize(types)) + 's' + ''.join(SLOTS[fieldType] for fieldType in types))
+
+def write(path, objects, clazz=None):
+  '''
+  Write a collection of objects of the same ValueObject class. Return the number of records.
+  '''
+  objects = list(objects)
+  if clazz is None:
+    if len(objects) == 0: raise StorageException('Empty collections need an explicit class')
+    clazz = objects[0].__class__
+  fields = objects[0].fields() if objects else sorted(clazz.constraints)
+  known = set(fields)
+  for index, obj in enumerate(objects):
+    if obj.__class__ is not clazz:
+      raise StorageException('All objects must be instances of ' + clazz.__name__)
+    extra = [field for field in obj.fields() if field not in known]
+    if extra:
+      raise StorageException('Fields ' + ', '.join(extra) + ' of object ' + str(index) + ' are not in the first object')
+  columns = [[vars(obj).get(field) for obj in objects] for field in fields]
+  types = [typeOf(field, column) for field, column in zip(fields, columns)]
+  record = recordStruct(types)
+
+  heap = bytearray()
+  records = bytearray(record.size * len(objects))
+  for index in range(len(objects)):
+    bitmap = bytearray(bitmapSize(types))
+    slots = []
+    for position, fieldType in enumerate(types):
+      value = columns[position][index]
+      if value is None:
+        bitmap[position // 8] |= 1 << (position % 8)
+        value = EMPTY[fieldType]
+      if fieldType == 'str':
+        encoded = value.encode('utf-8')
+        slots.extend((len(heap), len(encoded)))
+        heap.extend(encoded)
+      elif fieldType == 'float':
+        slots.append(float(value))
+      else:
+        slots.append(value)
+    try:
+      record.pack_into(records, index * record.size, bytes(bitmap), *slots)
+    except struct.error as e:
+      raise StorageException('Value out of range in record ' + str(index) + ': ' + str(e))
+
+  header = json.dumps({
+    'class': className(clazz),
+    'fields': [[field, fieldType] for field, fieldType in zip(fields, types)],
+    'fingerprint': fingerprint(clazz),
+    'count': len(objects),
+  }).encode('utf-8')
+  prefix = len(MAGIC) + HEADER_LENGTH.size + len(header)
+  padding = b'\x00' * (-prefix % 8)
+  with open(path, 'wb') as output:
+    output.write(MAGIC)
+    output.write(HEADER_LENGTH.pack(len(header)))
+    output.write(header)
+    output.write(padding)
+    output.write(records)
+    output.write(heap)
+  return len(objects)
+
+
+class RecordView(object):
+  '''
+  Read only view of one record: fields are decoded on each access
+  '''
+
+  __slots__ = ('_collection', '_index')
+
+  def __init__(self, collection, index):
+    self._collection = collection
+    self._index = index
+
+  def __getattr__(self, fieldName):
+    return self._collection.field(self._index, fieldName)
+
+  def __str__(self):
+    return str(self._collection[self._index])
+
+
+class MappedCollection(object):
+  '''
+  Collection of ValueObjects read from a file written by storage.write
+  '''
+
+  def __init__(self, path, clazz):
+    self.path = path
+    self.clazz = clazz
+    self.__file = open(path, 'rb')
+    try:
+      self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      self.__file.close()
+      raise StorageException('Invalid file ' + path)
+    self.__view = memoryview(self.__map)
+    try:
+      self.__readHeader()
+    except:
+      self.close()
+      raise
+
+  def __readHeader(self):
+    if bytes(self.__view[0:len(MAGIC)]) != MAGIC:
+      raise StorageException('Invalid file ' + self.path)
+    headerLength = HEADER_LENGTH.unpack_from(self.__view, len(MAGIC))[0]
+    start = len(MAGIC) + HEADER_LENGTH.size
+    header = json.loads(str(self.__view[start:start + headerLength], 'utf-8'))
+    if header['class'] != className(self.clazz):
+      raise StorageException('File stores ' + header['class'] + ' instead of ' + className(self.clazz))
+    if header['fingerprint'] != fingerprint(self.clazz):
+      raise StorageException('Constraints of ' + self.clazz.__name__ + ' changed since the file was written')
+    self.fieldNames = [field for field, fieldType in header['fields']]
+    self.fieldTypes = [fieldType for field, fieldType in header['fields']]
+    for attributeName in self.clazz.constraints:
+      if attributeName not in self.fieldNames:
+        raise StorageException('Field ' + attributeName + ' of ' + self.clazz.__name__ + ' is not stored')
+    self.__count = header['count']
+    self.__record = recordStruct(self.fieldTypes)
+    self.__positions = {}
+    # field -> (position, offset in the record, Struct of the slot, type), see field
+    self.__slots = {}
+    slot = 1
+    offset = bitmapSize(self.fieldTypes)
+    for position, (field, fieldType) in enumerate(header['fields']):
+      self.__positions[field] = (position, slot, fieldType)
+      slotStruct = struct.Struct('<' + SLOTS[fieldType])
+      self.__slots[field] = (position, offset, slotStruct, fieldType)
+      slot += len(SLOTS[fieldType])
+      offset += slotStruct.size
+    prefix = start + headerLength
+    self.__recordsStart = prefix + (-prefix % 8)
+    self.__heapStart = self.__recordsStart + self.__count * self.__record.size
+
+  def __offset(self, index):
+    if index < 0: index += self.__count
+    if not 0 <= index < self.__count:
+      raise IndexError('record index out of range')
+    return self.__recordsStart + index * self.__record.size
+
+  def __decode(self, fieldType, bitmap, position, slots, slot):
+    if bitmap[position // 8] & (1 << (position % 8)): return None
+    if fieldType == 'str':
+      start = self.__heapStart + slots[slot]
+      return str(self.__view[start:start + slots[slot + 1]], 'utf-8')
+    return slots[slot]
+
+  def field(self, index, fieldName):
+    '''
+    Decode only one field of one record
+    '''
+    if fieldName not in self.__slots:
+      raise AttributeError(fieldName)
+    position, offset, slotStruct, fieldType = self.__slots[fieldName]
+    start = self.__offset(index)
+    if self.__view[start + position // 8] & (1 << (position % 8)): return None
+    slots = slotStruct.unpack_from(self.__view, start + offset)
+    if fieldType == 'str':
+      start = self.__heapStart + slots[0]
+      return str(self.__view[start:start + slots[1]], 'utf-8')
+    return slots[0]
+
+  def view(self, index):
+    self.__offset(index)
+    return RecordView(self, index)
+
+  def __getitem__(self, index):
+    slots = self.__record.unpack_from(self.__view, self.__offset(index))
+    obj = self.clazz.__new__(self.clazz)
+    values = vars(obj)
+    for field, (position, slot, fieldType) in self.__positions.items():
+      values[field] = self.__decode(fieldType, slots[0], position, slots, slot)
+    return obj
+
+  def __len__(self):
+    return self.__count
+
+  def __iter__(self):
+    for index in range(self.__count):
+      yield self[index]
+
+  def close(self):
+    if self.__map.closed: return
+    self.__view.release()
+    self.__map.close()
+    self.__file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
@@ -21,8 +21,17 @@ MyEntity.addConstraints('somevariable', My = SomeRequiredValue)
 '''
 
 import re
+import math
 import inspect
+import functools
 from string import Template
+from domain import messages
+from domain.cache import LRUCache
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 class ConstraintException(Exception):
   '''
@@ -46,6 +55,11 @@ class Constraint(object):
   the methods valid (return a bool) and message (return a string)
   '''
   
+  # Relative cost of valid(): the cheapest constraints of an attribute are checked first
+  cost = 1
+  # If a gating constraint fails, the remaining constraints of the attribute are not checked
+  gating = False
+
   def __init__(self, attributeName=None, requiredValue=None, value=None):
     self.attributeName = attributeName
     self.requiredValue = requiredValue
@@ -70,23 +84,30 @@ class Constraint(object):
 class ConstraintFactory(object):
   
   constraintsRules = {}
+  # Incremented on each registration, so compiled validation plans can be detected as obsolete
+  version = 0
   
   @staticmethod
   def addConstraint(constraintClass):
     if not issubclass(constraintClass, Constraint):
       raise ConstraintException('Invalid Constraint, please, extend Constraint class') 
     ConstraintFactory.constraintsRules[constraintClass.getName()] = constraintClass
+    ConstraintFactory.version += 1
 
   @staticmethod
-  def getConstraint(name, attributeName, requiredValue, value):
-    if name in ConstraintFactory.constraintsRules:
-      constraint = ConstraintFactory.constraintsRules[name]()
-      constraint.attributeName = attributeName
-      constraint.requiredValue = requiredValue
-      constraint.value = value
-      return constraint
-    else:
+  def getConstraintClass(name):
+    constraintClass = ConstraintFactory.constraintsRules.get(name)
+    if constraintClass is None:
       raise ConstraintException('Constraint ' + name + 'Constraint not registered')
+    return constraintClass
+
+  @staticmethod
+  def getConstraint(name, attributeName, requiredValue, value):
+    constraint = ConstraintFactory.getConstraintClass(name)()
+    constraint.attributeName = attributeName
+    constraint.requiredValue = requiredValue
+    constraint.value = value
+    return constraint
   
 
 # Constraints
@@ -100,11 +121,8 @@ class MinConstraint(Constraint):
     return self.value >= self.requiredValue
   
   def message(self):
-    if isinstance(self.value, (str, list, dict, tuple)):
-      t = Template('$attr (= $value) must have length greater or equal than $required')
-    else:
-      t = Template('$attr (= $value) must be greater or equal than $required')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    variant = 'length' if isinstance(self.value, (str, list, dict, tuple)) else 'value'
+    return messages.format('Min', variant, attr=self.attributeName, value=self.value, required=self.requiredValue)
   
 MinConstraint.load()
   
@@ -117,58 +135,60 @@ class MaxConstraint(Constraint):
     return self.value <= self.requiredValue
   
   def message(self):
-    if isinstance(self.value, (str, list, dict, tuple)):
-      t = Template('$attr (= $value) must have length lower or equal than $required')
-    else:
-      t = Template('$attr (= $value) must be lower or equal than $required')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    variant = 'length' if isinstance(self.value, (str, list, dict, tuple)) else 'value'
+    return messages.format('Max', variant, attr=self.attributeName, value=self.value, required=self.requiredValue)
   
 MaxConstraint.load()
   
 class NullableConstraint(Constraint):
   
+  cost = 0
+  gating = True
+  
   def valid(self):
     if self.requiredValue: return True
     else: return self.value is not None
     
   def message(self):
-    t = Template('$attr (= $value) must be different of None')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Nullable', attr=self.attributeName, value=self.value, required=self.requiredValue)
   
 NullableConstraint.load()
     
 class MatchesConstraint(Constraint):
 
+  cost = 10
+
   def valid(self):
     if not isinstance(self.value, str): return False
     return re.match(self.requiredValue, self.value) is not None
   
   def message(self):
-    t = Template('$attr (= $value) must matches $required')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Matches', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 MatchesConstraint.load()
 
 class InListConstraint(Constraint):
 
+  cost = 2
+
   def valid(self):
     return self.value in self.requiredValue
   
   def message(self):
-    t = Template('$attr (= $value) must be in list $required')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('InList', attr=self.attributeName, value=self.value, required=self.requiredValue)
   
 InListConstraint.load()
 
 class ScaleConstraint(Constraint):
 
+  cost = 5
+
   def valid(self):
     if not isinstance(self.value, float): return False
     return len(re.sub('[0-9][.]', '', str(self.value))) <= self.requiredValue
   
   def message(self):
-    t = Template('$attr (= $value) must have $required decimals or less')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Scale', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 ScaleConstraint.load()
 
@@ -184,8 +204,7 @@ class EmailConstraint(MatchesConstraint):
     return matches.valid()
 
   def message(self):
-    t = Template('$attr (= $value) must be a valid e-mail address')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Email', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 EmailConstraint.load()
 
@@ -201,8 +220,7 @@ class IPConstraint(MatchesConstraint):
     return matches.valid()
     
   def message(self):
-    t = Template('$attr (= $value) must be a valid ip address')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('IP', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 IPConstraint.load()
 
@@ -218,13 +236,14 @@ class SiteConstraint(MatchesConstraint):
     return matches.valid()
     
   def message(self):
-    t = Template('$attr (= $value) must be a valid site address')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Site', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 SiteConstraint.load()
   
 class CustomConstraint(MatchesConstraint):
 
+  cost = 20
+
   def valid(self):
     return self.requiredValue(self.value)
   
@@ -232,7 +251,203 @@ class CustomConstraint(MatchesConstraint):
     '''
     TODO is it possible to print the lambda function?
     '''
-    t = Template('$attr (= $value) must be satisfied by specific function')
-    return t.substitute(attr=self.attributeName, value=self.value, required=self.requiredValue)
+    return messages.format('Custom', attr=self.attributeName, value=self.value, required=self.requiredValue)
 
 CustomConstraint.load()
+
+# Options of Each and EachKey, the other keys of the required value are constraints
+EACH_OPTIONS = ('collect',)
+# Elements of the same types that are checked by Min and Max without a loop in Python
+NUMBERS = frozenset([int, float])
+# Invalid indices shown in the message of Each
+MAX_INDICES_SHOWN = 10
+
+class EachConstraint(Constraint):
+  '''
+  Constraints applied to each element of a list, tuple or numpy array, or to each value of a dict.
+  The required value is a dict of constraints and options:
+
+  MyEntity.addConstraints('scores', Each = {'Min': 0, 'Max': 100})
+  MyEntity.addConstraints('tags', Each = {'Matches': '^[a-z]+$', 'collect': True})
+
+  The validation stops at the first invalid element, unless collect is True.
+  self.failures has the indices (or keys) of the invalid elements after valid().
+  Lists of numbers and numeric numpy arrays checked only by Min and Max are
+  validated without a loop in Python while all elements are valid.
+  '''
+
+  cost = 15
+
+  def collection(self):
+    if isinstance(self.value, (list, tuple, dict)): return True
+    return numpy is not None and isinstance(self.value, numpy.ndarray)
+
+  def elements(self):
+    '''
+    (index or key, element) of the checked elements
+    '''
+    if isinstance(self.value, dict): return self.value.items()
+    return enumerate(self.value)
+
+  def label(self, index):
+    return self.attributeName + '[' + repr(index) + ']'
+
+  def constraints(self):
+    '''
+    (name, required value) of the nested constraints, cheapest first
+    '''
+    nested = [(name, required) for name, required in self.requiredValue.items() if name not in EACH_OPTIONS]
+    nested.sort(key=lambda item: ConstraintFactory.getConstraintClass(item[0]).cost)
+    return nested
+
+  def valid(self):
+    if not self.collection():
+      self.failures = None
+      return False
+    collect = self.requiredValue.get('collect', False)
+    nested = self.constraints()
+    failures = self.vectorized(nested, collect)
+    if failures is None:
+      failures = []
+      constraints = [ConstraintFactory.getConstraint(name, self.attributeName, required, None) for name, required in nested]
+      for index, element in self.elements():
+        for constraint in constraints:
+          constraint.value = element
+          if not constraint.valid():
+            failures.append(index)
+            break
+        if failures and not collect: break
+    self.failures = failures
+    return len(failures) == 0
+
+  def vectorized(self, nested, collect):
+    '''
+    Invalid indices found without a loop in Python, or None if the fast path doesn't apply
+    '''
+    names = set(name for name, required in nested)
+    if not names or not names <= set(['Min', 'Max']) or isinstance(self.value, dict): return None
+    low, high = self.requiredValue.get('Min'), self.requiredValue.get('Max')
+    value = self.value
+    if numpy is not None and isinstance(value, numpy.ndarray):
+      if value.dtype.kind not in 'iuf': return None
+      # negated comparisons, so NaN is invalid as it is for MinConstraint and MaxConstraint
+      invalid = numpy.zeros(value.shape, dtype=bool)
+      if low is not None: invalid |= ~(value >= low)
+      if high is not None: invalid |= ~(value <= high)
+      indices = numpy.flatnonzero(invalid)
+      if not collect: indices = indices[:1]
+      return [int(index) for index in indices]
+    types = set(map(type, value))
+    if not types <= NUMBERS: return None
+    if float in types and any(map(math.isnan, value)): return None
+    if not value or ((low is None or min(value) >= low) and (high is None or max(value) <= high)):
+      return []
+    return None
+
+  def message(self):
+    if self.failures is None:
+      return messages.format('Each', 'type', attr=self.attributeName, value=self.value)
+    index = self.failures[0]
+    element = self.value.flat[index] if numpy is not None and isinstance(self.value, numpy.ndarray) else self.elementAt(index)
+    first = None
+    for name, required in self.constraints():
+      constraint = ConstraintFactory.getConstraint(name, self.label(index), required, element)
+      if not constraint.valid():
+        first = constraint.message()
+        break
+    if len(self.failures) == 1: return first
+    shown = ', '.join(repr(index) for index in self.failures[0:MAX_INDICES_SHOWN])
+    if len(self.failures) > MAX_INDICES_SHOWN: shown += ', ...'
+    return messages.format('Each', 'collected', attr=self.attributeName, count=len(self.failures), indices=shown, first=first)
+
+  def elementAt(self, index):
+    return self.value[index]
+
+EachConstraint.load()
+
+class EachKeyConstraint(EachConstraint):
+  '''
+  Same as EachConstraint, for the keys of a dict:
+
+  MyEntity.addConstraints('headers', EachKey = {'Matches': '^[A-Z][a-zA-Z-]*$'})
+  '''
+
+  def collection(self):
+    return isinstance(self.value, dict)
+
+  def elements(self):
+    return ((key, key) for key in self.value)
+
+  def label(self, index):
+    return self.attributeName + ' key'
+
+  def elementAt(self, index):
+    return index
+
+  def message(self):
+    if self.failures is None:
+      return messages.format('EachKey', 'type', attr=self.attributeName, value=self.value)
+    return EachConstraint.message(self)
+
+EachKeyConstraint.load()
+
+class CrossConstraint(Constraint):
+  '''
+  Constraint over many attributes, added by DataObject.addCrossConstraint.
+  attributeName is the name of the cross constraint, value is the tuple of the
+  values of the attributes and requiredValue is (attribute names, function, message template).
+  Without a template, the message comes from the catalog of messages.
+  '''
+
+  cost = 20
+
+  def valid(self):
+    return self.requiredValue[1](*self.value)
+
+  def message(self):
+    attributeNames, function, template = self.requiredValue
+    attrs = ', '.join(attributeNames)
+    values = ', '.join(str(value) for value in self.value)
+    if template is None:
+      return messages.format('Cross', name=self.attributeName, attrs=attrs, values=values)
+    t = Template(template)
+    return t.safe_substitute(dict(zip(attributeNames, self.value)), name=self.attributeName, attrs=attrs, values=values)
+
+class MemoizedFunction(object):
+  '''
+  Wrapper of the function of a Custom constraint that caches its results by value.
+  Unhashable values are not cached, the function is just called.
+  
+  MyEntity.addConstraints('sku', Custom = MemoizedFunction(checksum, maxSize = 10000, ttl = 300))
+  # or
+  MyEntity.addConstraints('sku', Custom = checksum, memoize = {'maxSize': 10000, 'ttl': 300})
+  
+  print(MyEntity.constraints['sku']['Custom'].stats())
+  '''
+
+  def __init__(self, function, maxSize=1024, ttl=None):
+    functools.update_wrapper(self, function)
+    self.function = function
+    self.cache = LRUCache(maxSize, ttl)
+    self.uncacheable = 0
+
+  def __call__(self, value):
+    # the class is part of the key because 1, 1.0 and True are equal keys
+    key = (value.__class__, value)
+    try:
+      found, result = self.cache.lookup(key)
+    except TypeError:
+      self.uncacheable += 1
+      return self.function(value)
+    if not found:
+      result = self.function(value)
+      self.cache.store(key, result)
+    return result
+
+  def stats(self):
+    stats = self.cache.stats()
+    stats['uncacheable'] = self.uncacheable
+    return stats
+
+  def clear(self):
+    self.cache.clear()
@@ -0,0 +1,109 @@
+'''
+Tests of the adaptive fail-fast validation
+'''
+
+import json
+import unittest
+from domain.adaptive import *
+from domain.dataobjects import *
+
+class AdaptiveValidatorTest(unittest.TestCase):
+
+  def newClass(self):
+    class Record(Entity):
+      def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+    Record.addConstraints('x', Min = 0)
+    Record.addConstraints('y', Nullable = False, Matches = '^[a-z]+$')
+    Record.addConstraints('z', Max = 10)
+    return Record
+
+  def testFirstErrorMustReturnOnlyOneMessage(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record)
+    self.assertEquals(None, validator.firstError(Record(1, 'a', 1)))
+    self.assertEquals(True, validator.valid(Record(1, 'a', 1)))
+    self.assertEquals(False, validator.valid(Record(-1, None, 20)))
+    self.assertTrue(validator.firstError(Record(-1, 'a', 20)) in Record(-1, 'a', 20).errors())
+
+  def testConstraintsThatRejectMoreRunFirst(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record, reorderEvery = 100, sampleEvery = 2)
+    for i in range(200):
+      validator.valid(Record(1, 'a', 20))
+    self.assertEquals(['z', 'Max'], validator.order()[0])
+
+  def testGatingConstraintsStayBeforeTheOtherConstraintsOfTheAttribute(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record, reorderEvery = 100, sampleEvery = 1)
+    for i in range(200):
+      validator.valid(Record(1, '1', 1))
+    order = validator.order()
+    self.assertEquals(order.index(['y', 'Nullable']) + 1, order.index(['y', 'Matches']))
+    self.assertEquals('y (= None) must be different of None', validator.firstError(Record(1, None, 1)))
+
+  def testSampledRunsStopTheAttributeAfterAFailedGatingConstraint(self):
+    class Record(Entity):
+      def __init__(self, x): self.x = x
+    Record.addConstraints('x', Nullable = False, Custom = lambda x: x > 0)
+    validator = AdaptiveValidator(Record, sampleEvery = 1)
+    self.assertEquals(Record(None).errors()[0], validator.firstError(Record(None)))
+
+  def testCrossConstraintsStayAfterTheGatingConstraintsOfTheirAttributes(self):
+    class Range(Entity):
+      def __init__(self, a, b):
+        self.a = a
+        self.b = b
+    Range.addConstraints('a', Nullable = False)
+    Range.addCrossConstraint('ordered', ['a', 'b'], lambda a, b: a <= b)
+    validator = AdaptiveValidator(Range, reorderEvery = 10, sampleEvery = 2)
+    for i in range(20):
+      validator.valid(Range(2, 1))
+    order = validator.order()
+    self.assertTrue(order.index(['a', 'Nullable']) < order.index(['ordered', 'Cross']))
+    self.assertEquals('a (= None) must be different of None', validator.firstError(Range(None, 1)))
+    self.assertEquals(None, validator.firstError(Range(1, 2)))
+
+  def testFrozenValidatorDoesNotLearn(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record, reorderEvery = 10)
+    order = validator.order()
+    validator.freeze()
+    for i in range(20):
+      validator.valid(Record(1, 'a', 20))
+    self.assertEquals(order, validator.order())
+    self.assertEquals(0, sum(row['evaluations'] for row in validator.statistics()))
+
+  def testExportedOrderCanBeImportedByAnotherValidator(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record, reorderEvery = 50)
+    for i in range(100):
+      validator.valid(Record(1, 'a', 20))
+    exported = json.loads(json.dumps(validator.exportOrder()))
+    another = AdaptiveValidator(Record)
+    another.importOrder(exported)
+    self.assertEquals(True, another.frozen)
+    self.assertEquals(validator.order(), another.order())
+
+  def testNewConstraintsAreIncludedAfterTheLearnedOnes(self):
+    Record = self.newClass()
+    validator = AdaptiveValidator(Record)
+    Record.addConstraints('z', Max = 10, Min = 5)
+    self.assertEquals(False, validator.valid(Record(1, 'a', 1)))
+    self.assertTrue(['z', 'Min'] in validator.order())
+
+  def testNestedObjectsAreValidated(self):
+    class Inner(Entity):
+      def __init__(self, x): self.x = x
+    Inner.addConstraints('x', Max = 2)
+    class Outer(Entity):
+      def __init__(self, inner): self.inner = inner
+    Outer.addConstraints('inner', Nullable = False)
+    self.assertEquals('x (= 3) must be lower or equal than 2', validatorFor(Outer).firstError(Outer(Inner(3))))
+    self.assertTrue(validatorFor(Outer) is validatorFor(Outer))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,115 @@
+'''
+Tests of the validation in a pool of threads
+'''
+
+import threading
+import time
+import unittest
+from domain.batch import *
+from domain.dataobjects import *
+
+class Shared(Entity):
+  def __init__(self, x): self.x = x
+Shared.addConstraints('x', Min = 0, Max = 100)
+
+class BatchValidatorTest(unittest.TestCase):
+
+  def testResultsKeepTheOrderOfTheObjects(self):
+    objects = [Shared(x) for x in range(-5, 200)]
+    expected = [obj.errors() for obj in objects]
+    with BatchValidator(workers = 4, chunkSize = 7) as validator:
+      self.assertEquals(expected, validator.validate(objects))
+    self.assertEquals(expected, validateAll(iter(objects), workers = 2))
+
+  def testEmptyBatch(self):
+    self.assertEquals([], validateAll([]))
+
+  def testCollectErrorsDoesNotChangeTheObject(self):
+    obj = Shared(-1)
+    state = dict(vars(obj))
+    self.assertEquals(['x (= -1) must be greater or equal than 0'], obj.collectErrors())
+    self.assertEquals(state, vars(obj))
+
+  def testIterateDeliversTheResultsInOrder(self):
+    objects = [Shared(x) for x in range(100)]
+    with BatchValidator(workers = 4, chunkSize = 3) as validator:
+      run = validator.iterate(objects)
+      self.assertEquals(objects, [obj for obj, errors in run])
+    self.assertEquals(None, run.stopped)
+    self.assertEquals(100, run.validated)
+    self.assertEquals(0, run.invalid)
+
+  def testRunStopsWhenTheErrorBudgetIsExceeded(self):
+    objects = [Shared(-x) for x in range(1, 1000)]
+    with BatchValidator(workers = 2, chunkSize = 5) as validator:
+      run = validator.run(objects, errorBudget = 3)
+    self.assertEquals(ERROR_BUDGET, run.stopped)
+    self.assertEquals(4, run.invalid)
+    self.assertEquals(4, len(run.errors))
+
+  def testRunStopsAtTheDeadline(self):
+    class Slow(Entity):
+      def __init__(self, x): self.x = x
+    Slow.addConstraints('x', Custom = lambda x: time.sleep(0.01) or True)
+    objects = [Slow(x) for x in range(1000)]
+    with BatchValidator(workers = 4, chunkSize = 2) as validator:
+      run = validator.run(objects, deadline = 0.1)
+    self.assertEquals(DEADLINE, run.stopped)
+    self.assertTrue(0 < run.validated < 1000)
+
+  def testThreadsOverlapBlockingCustomConstraints(self):
+    class Slow(Entity):
+      def __init__(self, x): self.x = x
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    def slow(x):
+      with lock:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+      time.sleep(0.02)
+      with lock:
+        running[0] -= 1
+      return True
+    Slow.addConstraints('x', Custom = slow)
+    objects = [Slow(x) for x in range(16)]
+    with BatchValidator(workers = 8, chunkSize = 1) as validator:
+      run = validator.run(objects)
+    self.assertEquals([[]] * 16, run.errors)
+    self.assertTrue(peak[0] > 1)
+
+
+class ConcurrentValidationStressTest(unittest.TestCase):
+
+  def testThreadsValidatingSharedObjectsGetTheirOwnErrors(self):
+    valid, invalid = Shared(1), Shared(-1)
+    expectedInvalid = ['x (= -1) must be greater or equal than 0']
+    failures = []
+    barrier = threading.Barrier(8)
+    def work(index):
+      barrier.wait()
+      for i in range(300):
+        obj = valid if (i + index) % 2 else invalid
+        errors = obj.errors()
+        if errors != ([] if obj is valid else expectedInvalid):
+          failures.append(errors)
+        if obj.valid() != (obj is valid):
+          failures.append(obj)
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    self.assertEquals([], failures)
+
+  def testBatchesOfTheSameObjectsInParallel(self):
+    objects = [Shared(x % 150 - 20) for x in range(1000)]
+    expected = [obj.collectErrors() for obj in objects]
+    with BatchValidator(workers = 8, chunkSize = 16) as validator:
+      results = []
+      threads = [threading.Thread(target=lambda: results.append(validator.validate(objects))) for i in range(4)]
+      for thread in threads: thread.start()
+      for thread in threads: thread.join()
+    self.assertEquals([expected] * 4, results)
+
+
+if __name__ == "__main__":
+  unittest.main()
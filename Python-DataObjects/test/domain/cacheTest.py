@@ -0,0 +1,65 @@
+'''
+Tests of the LRU cache
+'''
+
+import unittest
+from domain.cache import *
+
+class FakeClock(object):
+  def __init__(self): self.now = 0.0
+  def __call__(self): return self.now
+
+class LRUCacheTest(unittest.TestCase):
+
+  def testLookupOfMissingKey(self):
+    cache = LRUCache()
+    self.assertEquals((False, None), cache.lookup('a'))
+    self.assertEquals(1, cache.stats()['misses'])
+
+  def testStoreAndLookup(self):
+    cache = LRUCache()
+    cache.store('a', None)
+    self.assertEquals((True, None), cache.lookup('a'))
+    self.assertEquals(1, cache.stats()['hits'])
+    self.assertEquals(1.0, cache.hitRate())
+
+  def testLeastRecentlyUsedIsEvicted(self):
+    cache = LRUCache(maxSize = 2)
+    cache.store('a', 1)
+    cache.store('b', 2)
+    cache.lookup('a')
+    cache.store('c', 3)
+    self.assertEquals((True, 1), cache.lookup('a'))
+    self.assertEquals((False, None), cache.lookup('b'))
+    self.assertEquals(1, cache.stats()['evictions'])
+    self.assertEquals(2, len(cache))
+
+  def testExpiredEntriesAreMisses(self):
+    clock = FakeClock()
+    cache = LRUCache(ttl = 10, clock = clock)
+    cache.store('a', 1)
+    clock.now = 9
+    self.assertEquals((True, 1), cache.lookup('a'))
+    clock.now = 10
+    self.assertEquals((False, None), cache.lookup('a'))
+    self.assertEquals(1, cache.stats()['expirations'])
+    self.assertEquals(0, len(cache))
+
+  def testClearAndResetStats(self):
+    cache = LRUCache()
+    cache.store('a', 1)
+    cache.lookup('a')
+    cache.clear()
+    cache.resetStats()
+    self.assertEquals(0, len(cache))
+    self.assertEquals(0, cache.stats()['hits'])
+
+  def testInvalidSize(self):
+    try:
+      LRUCache(maxSize = 0)
+    except ValueError: pass
+    else: self.fail()
+
+
+if __name__ == "__main__":
+  unittest.main()
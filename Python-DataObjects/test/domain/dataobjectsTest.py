@@ -169,6 +169,297 @@ class DataObjectAddConstraintTest(unittest.TestCase):
     self.assertEquals('somefloat (= 1.23) must have 1 decimals or less', do.errors()[1])
     self.assertEquals('somedict (= {1: 1, 2: 2, 3: 3}) must have length lower or equal than 2', do.errors()[0])
     
+  def testCheapConstraintsMustRunFirst(self):
+    class MyDO(DataObject):
+      def __init__(self): self.x = 'xxx'
+    MyDO.addConstraints('x', Custom = lambda x: False, Matches = '[0-9]', Max = 2)
+    self.assertEquals(['x (= xxx) must have length lower or equal than 2',
+                       'x (= xxx) must matches [0-9]',
+                       'x (= xxx) must be satisfied by specific function'], MyDO().errors())
+
+  def testFailedNullableMustSkipTheOtherConstraintsOfTheAttribute(self):
+    calls = []
+    class MyDO(DataObject):
+      def __init__(self):
+        self.x = None
+        self.y = None
+    MyDO.addConstraints('x', Min = 3, Custom = lambda x: calls.append(x), Nullable = False)
+    MyDO.addConstraints('y', Min = 3)
+    self.assertEquals(['x (= None) must be different of None',
+                       'y (= None) must be greater or equal than 3'], MyDO().errors())
+    self.assertEquals([], calls)
+
+  def testValidationPlanIsCompiledOnceAndRecompiledWhenConstraintsChange(self):
+    class MyDO(DataObject):
+      def __init__(self): self.x = 1
+    MyDO.addConstraints('x', Min = 1)
+    plan = MyDO.validationPlan()
+    self.assertTrue(plan is MyDO.validationPlan())
+    self.assertEquals(True, MyDO().valid())
+    MyDO.addConstraints('x', Min = 2)
+    self.assertFalse(plan is MyDO.validationPlan())
+    self.assertEquals(False, MyDO().valid())
+
+  def testPlansOfSubclassesAreRecompiledWhenTheBaseClassChanges(self):
+    class Base(DataObject):
+      def __init__(self): self.x = 1
+    class Child(Base): pass
+    class Sibling(Base): pass
+    Base.addConstraints('x', Min = 1)
+    self.assertEquals(True, Child().valid())
+    Base.addConstraints('x', Min = 2)
+    self.assertEquals(False, Child().valid())
+    plan = Base.validationPlan()
+    Sibling.addConstraints('x', Max = 5)
+    self.assertTrue(plan is Base.validationPlan())
+
+  def testPlanIsRecompiledWhenItsConstraintClassIsReplaced(self):
+    class MyDO(DataObject):
+      def __init__(self): self.x = 1
+    MyDO.addConstraints('x', Min = 5)
+    plan = MyDO.validationPlan()
+    class OtherConstraint(Constraint):
+      def valid(self): return True
+    OtherConstraint.load()
+    self.assertTrue(plan is MyDO.validationPlan())
+    original = ConstraintFactory.getConstraintClass('Min')
+    class MinConstraint(Constraint):
+      def valid(self): return True
+    try:
+      MinConstraint.load()
+      self.assertEquals(True, MyDO().valid())
+    finally:
+      original.load()
+    self.assertEquals(False, MyDO().valid())
+
+  def testValidationOfSomeFields(self):
+    class MyDO(DataObject):
+      def __init__(self):
+        self.x = 1
+        self.y = 'abc'
+        self.z = None
+    MyDO.addConstraints('x', Min = 2)
+    MyDO.addConstraints('y', Max = 2)
+    MyDO.addConstraints('z', Nullable = False)
+    do = MyDO()
+    self.assertEquals(3, len(do.errors()))
+    self.assertEquals(['x (= 1) must be greater or equal than 2'], do.errors(fields = ['x']))
+    self.assertEquals(['y (= abc) must have length lower or equal than 2'], do.errors(fields = ('y',)))
+    self.assertEquals(True, do.valid(fields = []))
+    self.assertEquals(False, do.valid(fields = ['z']))
+    do.validate(fields = ['x', 'y'])
+    self.assertEquals(True, MyDO.validationPlan(['x', 'y']) is MyDO.validationPlan(set(['y', 'x'])))
+
+  def testValidationOfOneFieldName(self):
+    class MyDO(DataObject):
+      def __init__(self):
+        self.age = -1
+        self.name = ''
+    MyDO.addConstraints('age', Min = 0)
+    MyDO.addConstraints('name', Nullable = False)
+    self.assertEquals(['age (= -1) must be greater or equal than 0'], MyDO().errors(fields = 'age'))
+    self.assertEquals(True, MyDO.validationPlan('age') is MyDO.validationPlan(['age']))
+
+  def testValidationOfUnknownFieldsMustRaiseAnException(self):
+    class MyDO(DataObject):
+      def __init__(self):
+        self.age = 1
+        self.extra = None
+    MyDO.addConstraints('age', Min = 0)
+    try:
+      MyDO().errors(fields = ['age', 'agee'])
+    except ConstraintException:
+      pass
+    else:
+      self.fail()
+    try:
+      MyDO.validateMapping({'age': 1}, fields = ['nope'])
+    except ConstraintException:
+      pass
+    else:
+      self.fail()
+    self.assertEquals([], MyDO().errors(fields = ['age', 'extra']))
+
+  def testValidationOfSomeFieldsSelectsDottedAttributes(self):
+    class Inner(DataObject):
+      def __init__(self): self.name = 'abc'
+    class MyDO(DataObject):
+      def __init__(self):
+        self.inner = Inner()
+        self.x = 1
+    MyDO.addConstraints('inner.name', Max = 2)
+    MyDO.addConstraints('x', Min = 2)
+    self.assertEquals(['inner.name (= abc) must have length lower or equal than 2'], MyDO().errors(fields = ['inner']))
+
+  def testPlanOfSomeFieldsIsRecompiledWhenConstraintsChange(self):
+    class MyDO(DataObject):
+      def __init__(self): self.x = 1
+    MyDO.addConstraints('x', Min = 1)
+    self.assertEquals(True, MyDO().valid(fields = ['x']))
+    MyDO.addConstraints('x', Min = 2)
+    self.assertEquals(False, MyDO().valid(fields = ['x']))
+
+  def testCrossConstraint(self):
+    class Period(DataObject):
+      def __init__(self, start, end):
+        self.start = start
+        self.end = end
+    Period.addConstraints('start', Min = 0)
+    Period.addCrossConstraint('order', ['start', 'end'], lambda start, end: start <= end)
+    self.assertEquals([], Period(1, 2).errors())
+    self.assertEquals(['start, end (= 3, 2) must satisfy order'], Period(3, 2).errors())
+    self.assertEquals(['start (= -1) must be greater or equal than 0',
+                       'start, end (= -1, -2) must satisfy order'], Period(-1, -2).errors())
+
+  def testCrossConstraintWithMessage(self):
+    class Period(DataObject):
+      def __init__(self, start, end):
+        self.start = start
+        self.end = end
+    Period.addCrossConstraint('order', ['start', 'end'], lambda start, end: start <= end, '$start must not be after $end ($name)')
+    self.assertEquals(['3 must not be after 2 (order)'], Period(3, 2).errors())
+
+  def testCrossConstraintIsSkippedWhenAGatingConstraintOfItsAttributesFails(self):
+    class Period(DataObject):
+      def __init__(self, start, end):
+        self.start = start
+        self.end = end
+    Period.addConstraints('start', Nullable = False)
+    Period.addCrossConstraint('order', ['start', 'end'], lambda start, end: start <= end)
+    self.assertEquals(['start (= None) must be different of None'], Period(None, 2).errors())
+
+  def testCrossConstraintsAreInheritedAndEachClassHasItsOwn(self):
+    class Base(DataObject):
+      def __init__(self):
+        self.a = 1
+        self.b = 2
+    class Derived(Base): pass
+    Base.addCrossConstraint('ab', ['a', 'b'], lambda a, b: a > b)
+    Derived.addCrossConstraint('ba', ['b', 'a'], lambda b, a: b > a)
+    self.assertEquals(1, len(Base.crossConstraints))
+    self.assertEquals(2, len(Derived.crossConstraints))
+    self.assertEquals(1, len(Derived().errors()))
+
+  def testEachConstraintValidatesTheElementsOfAnAttribute(self):
+    class Exam(DataObject):
+      def __init__(self, scores): self.scores = scores
+    Exam.addConstraints('scores', Max = 3, Each = {'Min': 0, 'Max': 100})
+    self.assertEquals([], Exam([0, 50, 100]).errors())
+    self.assertEquals(['scores[2] (= 101) must be lower or equal than 100'], Exam([0, 50, 101]).errors())
+    self.assertEquals(['scores (= [1, 2, 3, 4]) must have length lower or equal than 3'], Exam([1, 2, 3, 4]).errors())
+
+  def testValidateMappingWithoutCreatingTheObject(self):
+    created = []
+    class Person(DataObject):
+      def __init__(self, name, age):
+        created.append(self)
+        self.name = name
+        self.age = age
+    Person.addConstraints('name', Nullable = False)
+    Person.addConstraints('age', Min = 0)
+    Person.addCrossConstraint('adult', ['name', 'age'], lambda name, age: name != 'child' or age < 18)
+    self.assertEquals([], Person.validateMapping({'name': 'paulo', 'age': 30}))
+    self.assertEquals(['name (= None) must be different of None', 'age (= -1) must be greater or equal than 0'],
+                      Person.validateMapping({'age': -1}))
+    self.assertEquals(['name, age (= child, 20) must satisfy adult'], Person.validateMapping({'name': 'child', 'age': 20}))
+    self.assertEquals(['name (= None) must be different of None'], Person.validateMapping({'age': 1}, fields = ['name']))
+    self.assertEquals(['name (= None) must be different of None'], Person.validateMapping({'age': 'x'}, exclude = ['age']))
+    self.assertEquals([], created)
+
+  def testValidateRowsWithAColumnMap(self):
+    class Person(DataObject): pass
+    Person.addConstraints('name', Nullable = False)
+    Person.addConstraints('age', Min = 0)
+    self.assertEquals([[], ['age (= -1) must be greater or equal than 0'], ['name (= None) must be different of None']],
+                      Person.validateRows([('a', 1), ('b', -1), (None, 2)], columns = ['name', 'age']))
+    self.assertEquals([[], ['age (= -1) must be greater or equal than 0']],
+                      Person.validateRows([{'NAME': 'a', 'AGE': 1}, {'NAME': 'b', 'AGE': -1}], columns = {'name': 'NAME', 'age': 'AGE'}))
+
+  def testValidateMappingWithDottedAttributes(self):
+    class Order(DataObject): pass
+    Order.addConstraints('address.zip', Nullable = False, Matches = '^[0-9]+$')
+    self.assertEquals([], Order.validateMapping({'address': {'zip': '123'}}))
+    self.assertEquals(['address.zip (= None) must be different of None'], Order.validateMapping({'address': {}}))
+
+  def testConstraintGroupsReplaceTheDefaultConstraintsOfTheirAttributes(self):
+    class User(DataObject):
+      def __init__(self, name, email):
+        self.name = name
+        self.email = email
+    User.addConstraints('name', Nullable = False)
+    User.addConstraints('email', Nullable = False)
+    User.addConstraints('email', group = 'draft')
+    User.addConstraints('name', group = 'import', Max = 3)
+    draft = User('paulo', None)
+    self.assertEquals(['email (= None) must be different of None'], draft.errors())
+    self.assertEquals([], draft.errors(group = 'draft'))
+    self.assertEquals(True, draft.valid(group = 'draft'))
+    self.assertEquals(['name (= paulo) must have length lower or equal than 3',
+                       'email (= None) must be different of None'], draft.errors(group = 'import'))
+    self.assertEquals(['draft', 'import'], User.groups())
+    self.assertTrue(User.validationPlan(group = 'draft') is User.validationPlan(group = 'draft'))
+    self.assertEquals({'name': {'Nullable': False}, 'email': {'Nullable': False}}, User.constraints)
+
+  def testConstraintGroupsAreInheritedWithoutCopies(self):
+    class Base(DataObject):
+      def __init__(self):
+        self.a = None
+        self.b = None
+    class Derived(Base): pass
+    Base.addConstraints('a', group = 'create', Nullable = False)
+    Derived.addConstraints('b', group = 'create', Nullable = False)
+    self.assertEquals(1, len(Base().errors(group = 'create')))
+    self.assertEquals(2, len(Derived().errors(group = 'create')))
+    self.assertEquals(['b'], list(Derived.__dict__['_DataObject__groups']['create'][0]))
+    Base.addCrossConstraint('ab', ['a', 'b'], lambda a, b: a == b, group = 'create')
+    obj = Derived()
+    obj.b = 1
+    self.assertEquals(['a (= None) must be different of None'], obj.errors(group = 'create'))
+    obj.a = 2
+    self.assertEquals(['a, b (= 2, 1) must satisfy ab'], obj.errors(group = 'create'))
+    self.assertEquals([], obj.errors())
+
+  def testUnknownGroupMustRaiseAnException(self):
+    class Base(DataObject): pass
+    try:
+      Base().validate(group = 'typo')
+    except ConstraintException:
+      pass
+    else:
+      self.fail()
+
+  def testPartialValidationRunsOnlyTheAffectedCrossConstraints(self):
+    calls = []
+    class Entity3(DataObject):
+      def __init__(self):
+        self.a = 1
+        self.b = 2
+        self.c = 3
+    Entity3.addCrossConstraint('ab', ['a', 'b'], lambda a, b: calls.append('ab') or a < b)
+    Entity3.addCrossConstraint('bc', ['b', 'c'], lambda b, c: calls.append('bc') or b < c)
+    self.assertEquals({'a': ['ab'], 'b': ['ab', 'bc'], 'c': ['bc']}, Entity3.dependencyGraph())
+    obj = Entity3()
+    obj.c = 0
+    self.assertEquals(['b, c (= 2, 0) must satisfy bc'], obj.errors(fields = ['c']))
+    self.assertEquals(['bc'], calls)
+    obj.a = 0
+    self.assertEquals([], obj.errors(fields = ['a']))
+    self.assertEquals(['bc', 'ab'], calls)
+
+  def testMemoizeOptionMustCacheTheCustomFunction(self):
+    calls = []
+    def check(value):
+      calls.append(value)
+      return value > 0
+    class MyDO(DataObject):
+      def __init__(self, x): self.x = x
+    MyDO.addConstraints('x', Custom = check, memoize = {'maxSize': 10})
+    self.assertEquals(True, MyDO(1).valid())
+    self.assertEquals(True, MyDO(1).valid())
+    self.assertEquals(False, MyDO(-1).valid())
+    self.assertEquals([1, -1], calls)
+    self.assertEquals(10, MyDO.constraints['x']['Custom'].stats()['maxSize'])
+
   def testConstraintOfInexistentVariableMustRaiseAConstraintException(self):
     class MyDO(DataObject): pass
     MyDO.addConstraints('someconstraint', Min = 1)
@@ -377,6 +668,147 @@ class DataObjectToStringTest(unittest.TestCase):
         self.inner = inner
     self.assertEquals('MyDO: inner=(MyInnerDO: x=(6)), x=(5)', str(MyDO(5, MyInnerDO(6))))
 
+  def testToStringMustIgnoreValidationState(self):
+    class MyDO(DataObject):
+      def __init__(self, x):
+        self.x = x
+    MyDO.addConstraints('x', Min = 6)
+    do = MyDO(5)
+    do.validate()
+    self.assertEquals('MyDO: x=(5)', str(do))
+
+  def testToStringWithLimitsButSmallValuesMustKeepTheFormat(self):
+    class MyDO(DataObject):
+      maxItemsToShow = 3
+      maxDepthToShow = 3
+      def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+    self.assertEquals("MyDO: x=([1, 'a']), y=({1: (2,)}), z=(abc)", str(MyDO([1, 'a'], {1: (2,)}, 'abc')))
+
+  def testToStringMustTruncateLargeContainers(self):
+    class MyDO(DataObject):
+      maxItemsToShow = 2
+      def __init__(self, x, y):
+        self.x = x
+        self.y = y
+    self.assertEquals('MyDO: x=([1, 2, ...(3 more)]), y=({1: 1, 2: 2, ...(1 more)})',
+                      str(MyDO([1, 2, 3, 4, 5], {1: 1, 2: 2, 3: 3})))
+
+  def testToStringMustTruncateDeepObjects(self):
+    class MyDO(DataObject):
+      maxDepthToShow = 1
+      def __init__(self, x, inner):
+        self.x = x
+        self.inner = inner
+    self.assertEquals('MyDO: inner=(MyDO: inner=(MyDO(...)), x=([...])), x=([[...]])',
+                      str(MyDO([[1]], MyDO([2], MyDO(3, None)))))
+
+  def testRepr(self):
+    class MyInnerDO(DataObject):
+      def __init__(self, x):
+        self.x = x
+    class MyDO(DataObject):
+      def __init__(self, x, inner):
+        self.x = x
+        self.inner = inner
+    self.assertEquals("MyDO(inner=MyInnerDO(x='6'), x=[5])", repr(MyDO([5], MyInnerDO('6'))))
+    self.assertEquals('[MyInnerDO(x=1)]', str([MyInnerDO(1)]))
+
+class EntityIdentityTest(unittest.TestCase):
+
+  def testEntitiesWithoutIdentifierAreEqualOnlyToThemselves(self):
+    class MyEntity(Entity):
+      def __init__(self, id): self.id = id
+    entity = MyEntity(1)
+    self.assertTrue(entity == entity)
+    self.assertTrue(entity != MyEntity(1))
+    self.assertEquals(2, len(set([entity, entity, MyEntity(1)])))
+
+  def testEntitiesAreEqualByIdentifier(self):
+    class MyEntity(Entity):
+      identifier = 'id'
+      def __init__(self, id, name = None):
+        self.id = id
+        self.name = name
+    class AnotherEntity(Entity):
+      identifier = 'id'
+      def __init__(self, id): self.id = id
+    self.assertTrue(MyEntity(1, 'a') == MyEntity(1, 'b'))
+    self.assertTrue(MyEntity(1) != MyEntity(2))
+    self.assertTrue(MyEntity(1) != AnotherEntity(1))
+    self.assertTrue(MyEntity(None) != MyEntity(None))
+    self.assertEquals(2, len(set([MyEntity(1), MyEntity(2), MyEntity(1)])))
+
+
+class EntityChangeTrackingTest(unittest.TestCase):
+
+  def newClass(self):
+    class Account(Entity):
+      def __init__(self, owner, balance):
+        self.owner = owner
+        self.balance = balance
+    Account.addConstraints('owner', Nullable = False)
+    Account.addConstraints('balance', Min = 0)
+    Account.enableChangeTracking()
+    return Account
+
+  def testNewObjectsHaveAllVariablesChanged(self):
+    Account = self.newClass()
+    account = Account('ana', 10)
+    self.assertEquals({'owner': (MISSING, 'ana'), 'balance': (MISSING, 10)}, account.changes())
+    account.commit()
+    self.assertEquals({}, account.changes())
+
+  def testChangesAfterCommit(self):
+    Account = self.newClass()
+    account = Account('ana', 10)
+    account.commit()
+    account.balance = 20
+    account.balance = -5
+    account.owner = 'ana'
+    account.extra = 1
+    self.assertEquals({'balance': (10, -5), 'extra': (MISSING, 1)}, account.changes())
+    self.assertEquals(['balance (= -5) must be greater or equal than 0'], account.errors(fields = account.changes()))
+    del account.owner
+    self.assertEquals((MISSING, 1), account.changes()['extra'])
+    self.assertEquals(('ana', MISSING), account.changes()['owner'])
+
+  def testRollbackRestoresTheOriginalValues(self):
+    Account = self.newClass()
+    account = Account('ana', 10)
+    account.commit()
+    account.balance = 20
+    account.extra = 1
+    del account.owner
+    account.rollback()
+    self.assertEquals(['balance', 'owner'], account.fields())
+    self.assertEquals(10, account.balance)
+    self.assertEquals('ana', account.owner)
+    self.assertEquals({}, account.changes())
+
+  def testInternalVariablesAreNotTracked(self):
+    Account = self.newClass()
+    account = Account('ana', 10)
+    account.commit()
+    account._cache = 1
+    account.validate()
+    self.assertEquals({}, account.changes())
+    self.assertEquals('Account: _cache=(1), balance=(10), owner=(ana)', str(account))
+
+  def testTrackingIsOptIn(self):
+    class Plain(Entity): pass
+    self.assertEquals(False, Plain.tracksChanges())
+    self.assertEquals(True, self.newClass().tracksChanges())
+    try:
+      Plain().changes()
+    except ConstraintException:
+      pass
+    else:
+      self.fail()
+
+
 class ValueObjectTest(unittest.TestCase):
   
   def testEqualAndNotEqualWithoutAttributes(self):
@@ -460,6 +892,161 @@ class ValueObjectTest(unittest.TestCase):
     self.assertEquals(MyVO1(), MyVO1())
     self.assertEquals(MyVO2(), MyVO2())
     
+class ValueObjectEvolveTest(unittest.TestCase):
+
+  def newClass(self, calls):
+    class Point(ValueObject):
+      def __init__(self, x, y, tags):
+        self.x = x
+        self.y = y
+        self.tags = tags
+    Point.addConstraints('x', Min = 0)
+    Point.addConstraints('y', Custom = lambda y: calls.append(y) or y >= 0)
+    return Point
+
+  def testEvolveSharesTheUnchangedValues(self):
+    Point = self.newClass([])
+    point = Point(1, 2, ['a'])
+    evolved = point.evolve(x = 3)
+    self.assertEquals(3, evolved.x)
+    self.assertEquals(1, point.x)
+    self.assertTrue(evolved.tags is point.tags)
+    self.assertEquals(Point(3, 2, ['a']), evolved)
+    self.assertEquals(hash(Point(3, 2, ('a',))), hash(Point(1, 2, ('a',)).evolve(x = 3)))
+    self.assertTrue(point != evolved)
+
+  def testEvolveOfAnUnknownVariableMustRaiseAnException(self):
+    Point = self.newClass([])
+    try:
+      Point(1, 2, []).evolve(z = 1)
+    except ConstraintException:
+      pass
+    else:
+      self.fail()
+
+  def testOnlyTheChangedVariablesAreValidatedAgain(self):
+    calls = []
+    Point = self.newClass(calls)
+    Point.incrementalValidation = True
+    point = Point(1, 2, [])
+    self.assertEquals(True, point.valid())
+    self.assertEquals([2], calls)
+    self.assertEquals(True, point.valid())
+    self.assertEquals(['x (= -1) must be greater or equal than 0'], point.evolve(x = -1).errors())
+    self.assertEquals(True, point.evolve(x = 5).valid())
+    self.assertEquals([2], calls)
+    self.assertEquals(['y (= -1) must be satisfied by specific function'], point.evolve(y = -1).errors())
+    self.assertEquals([2, -1], calls)
+
+  def testEveryValidationRunsWithoutIncrementalValidation(self):
+    calls = []
+    Point = self.newClass(calls)
+    point = Point(1, 2, [])
+    self.assertEquals(True, point.valid())
+    self.assertEquals(True, point.valid())
+    self.assertEquals(True, point.evolve(x = 5).valid())
+    self.assertEquals([2, 2, 2], calls)
+
+  def testChangesInsideAListAreValidatedWithoutIncrementalValidation(self):
+    Point = self.newClass([])
+    Point.addConstraints('tags', Max = 2)
+    point = Point(1, 2, [1])
+    self.assertEquals(True, point.valid())
+    point.tags.extend([2, 3])
+    self.assertEquals(False, point.valid())
+
+  def testValidationDoesNotChangeTheObject(self):
+    Point = self.newClass([])
+    Point.incrementalValidation = True
+    point = Point(-1, 2, [])
+    point.collectErrors()
+    self.assertEquals(['tags', 'x', 'y'], sorted(vars(point)))
+
+  def testAssignedVariablesAreValidatedAgain(self):
+    Point = self.newClass([])
+    Point.incrementalValidation = True
+    point = Point(1, 2, [])
+    self.assertEquals(True, point.valid())
+    point.x = -1
+    self.assertEquals(False, point.valid())
+    point.x = 1
+    self.assertEquals(True, point.valid())
+
+  def testNewConstraintsAreValidated(self):
+    Point = self.newClass([])
+    Point.incrementalValidation = True
+    point = Point(1, 2, [])
+    self.assertEquals(True, point.valid())
+    Point.addConstraints('x', Min = 2)
+    self.assertEquals(False, point.evolve(y = 3).valid())
+
+  def testInternalStateIsNotPartOfTheEquality(self):
+    class MyVO(ValueObject):
+      def __init__(self, x): self.x = x
+    MyVO.addConstraints('x', Min = 0)
+    validated = MyVO(1)
+    validated.validate()
+    self.assertEquals(MyVO(1), validated)
+
+
+class ValueObjectValidationCacheTest(unittest.TestCase):
+
+  def newClass(self, calls):
+    class Code(ValueObject):
+      validationCacheSize = 2
+      def __init__(self, code, size = 1):
+        self.code = code
+        self.size = size
+    Code.addConstraints('code', Custom = lambda code: calls.append(code) or code.isupper())
+    Code.addConstraints('size', Scale = 1)
+    return Code
+
+  def testEqualValuesAreValidatedOnce(self):
+    calls = []
+    Code = self.newClass(calls)
+    for i in range(10):
+      self.assertEquals([], Code('BR', 1.5).errors())
+      self.assertEquals(['code (= br) must be satisfied by specific function'], Code('br', 1.5).errors())
+    self.assertEquals(['BR', 'br'], calls)
+    self.assertEquals(18 / 20.0, Code.validationCache().hitRate())
+
+  def testClassesOfTheValuesArePartOfTheKey(self):
+    Code = self.newClass([])
+    self.assertEquals([], Code('BR', 1.0).errors())
+    self.assertEquals(['size (= 1) must have 1 decimals or less'], Code('BR', 1).errors())
+
+  def testCacheIsKeptWhenOtherClassesChange(self):
+    Code = self.newClass([])
+    for i in range(10):
+      Code('BR', 1.5).valid()
+    class Other(DataObject): pass
+    Other.addConstraints('x', Min = 1)
+    class AnotherConstraint(Constraint):
+      def valid(self): return True
+    AnotherConstraint.load()
+    self.assertEquals(9, Code.validationCache().hits)
+
+  def testCacheIsBoundedAndClearedByNewConstraints(self):
+    calls = []
+    Code = self.newClass(calls)
+    for code in ['A', 'B', 'C', 'A']:
+      Code(code, 1.0).valid()
+    self.assertEquals(['A', 'B', 'C', 'A'], calls)
+    self.assertEquals(2, len(Code.validationCache()))
+    Code.addConstraints('size', Min = 2)
+    self.assertEquals(0, len(Code.validationCache()))
+    self.assertEquals(False, Code('A', 1.0).valid())
+
+  def testUnhashableValuesAreNotCached(self):
+    Code = self.newClass([])
+    self.assertEquals(False, Code('A', [1.0]).valid())
+    self.assertEquals(0, len(Code.validationCache()))
+
+  def testWithoutSizeThereIsNoCache(self):
+    class MyVO(ValueObject): pass
+    self.assertEquals(None, MyVO.validationCache())
+
+
 class OrderedValueObjectTest(unittest.TestCase):
     
   def testVOWithoutAttributs(self):
@@ -470,6 +1057,17 @@ class OrderedValueObjectTest(unittest.TestCase):
     self.assertFalse(MyVO() > MyVO())
     self.assertTrue(MyVO() >= MyVO())
     
+  def testInternalStateIsNotPartOfTheOrder(self):
+    class MyVO(OrderedValueObject):
+      def __init__(self, a, b):
+        self.a = a
+        self.b = b
+    MyVO.addConstraints('a', Min = 4)
+    small, big = MyVO(3, 9), MyVO(5, 1)
+    small.validate()
+    self.assertFalse(big < small)
+    self.assertTrue(small < big)
+
   def testVOWithOneNumberAttribute(self):
     class MyVO(OrderedValueObject):
       def __init__(self, value):
@@ -0,0 +1,86 @@
+'''
+Tests of the validation of CSV and JSONL files
+'''
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from domain.files import *
+from domain.dataobjects import *
+
+class Person(Entity):
+  def __init__(self, name, age):
+    self.name = name
+    self.age = age
+Person.addConstraints('name', Nullable = False)
+Person.addConstraints('age', Nullable = False, Min = 0)
+
+class FileValidationTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def path(self, name):
+    return os.path.join(self.directory, name)
+
+  def write(self, name, text):
+    with open(self.path(name), 'w') as output:
+      output.write(text)
+    return self.path(name)
+
+  def read(self, name):
+    with open(self.path(name)) as source:
+      return source.read()
+
+  def testCsvFileWithColumnsAndTypes(self):
+    path = self.write('people.csv', 'NAME,AGE\npaulo,30\n,20\nana,-1\n,x\n')
+    stats = validateFile(path, Person, columns = {'name': 'NAME', 'age': 'AGE'}, types = {'age': int},
+                         valid = self.path('ok.csv'), rejects = self.path('bad.csv'), report = self.path('report.jsonl'),
+                         chunkSize = 2)
+    self.assertEquals(4, stats['rows'])
+    self.assertEquals(1, stats['valid'])
+    self.assertEquals(3, stats['invalid'])
+    self.assertEquals(2, stats['chunks'])
+    self.assertEquals('NAME,AGE\npaulo,30\n', self.read('ok.csv').replace('\r', ''))
+    self.assertEquals('NAME,AGE\n,20\nana,-1\n,x\n', self.read('bad.csv').replace('\r', ''))
+    report = [json.loads(line) for line in self.read('report.jsonl').splitlines()]
+    self.assertEquals([{'row': 2, 'errors': ['name (= None) must be different of None']},
+                       {'row': 3, 'errors': ['age (= -1) must be greater or equal than 0']},
+                       {'row': 4, 'errors': ['age (= x) must be convertible by int', 'name (= None) must be different of None']}], report)
+
+  def testJsonlFileInManyProcesses(self):
+    lines = [json.dumps({'name': 'p' + str(i), 'age': i - 50}) for i in range(200)]
+    path = self.write('people.jsonl', '\n'.join(lines) + '\n')
+    stats = validateFile(path, Person, rejects = self.path('bad.jsonl'), chunkSize = 16, processes = 2)
+    self.assertEquals(200, stats['rows'])
+    self.assertEquals(50, stats['invalid'])
+    rejected = [json.loads(line)['age'] for line in self.read('bad.jsonl').splitlines()]
+    self.assertEquals(list(range(-50, 0)), rejected)
+
+  def testUnknownFormatMustRaiseAnException(self):
+    try:
+      validateFile(self.write('people.txt', ''), Person)
+    except FileValidationException:
+      pass
+    else:
+      self.fail()
+
+  def testCommandLine(self):
+    path = self.write('people.csv', 'name,age\npaulo,30\nana,-1\n')
+    output = io.StringIO()
+    with redirect_stdout(output):
+      status = main(['filesTest:Person', path, '--type', 'age=int', '--report', self.path('report.jsonl')])
+    self.assertEquals(1, status)
+    self.assertEquals(1, json.loads(output.getvalue())['invalid'])
+    self.assertEquals(1, len(self.read('report.jsonl').splitlines()))
+
+
+if __name__ == "__main__":
+  unittest.main()
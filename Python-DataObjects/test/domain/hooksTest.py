@@ -0,0 +1,94 @@
+'''
+Tests of the validation lifecycle hooks
+'''
+
+import unittest
+from domain import hooks
+from domain.dataobjects import *
+
+class HooksTest(unittest.TestCase):
+
+  def setUp(self):
+    self.events = []
+
+  def tearDown(self):
+    hooks.clear()
+
+  def record(self, event):
+    self.events.append(event)
+
+  def testWithoutHooksNothingIsActive(self):
+    self.assertEquals(False, hooks.active)
+    hooks.addHook(hooks.AFTER_VALIDATE, self.record)
+    self.assertEquals(True, hooks.active)
+    hooks.removeHook(hooks.AFTER_VALIDATE, self.record)
+    self.assertEquals(False, hooks.active)
+
+  def testUnknownEventMustRaiseAHookException(self):
+    try:
+      hooks.addHook('unknown', self.record)
+    except hooks.HookException: pass
+    else: self.fail()
+
+  def testLifecycleOfAValidation(self):
+    class Inner(Entity):
+      def __init__(self, name): self.name = name
+    Inner.addConstraints('name', Max = 2)
+    class Outer(Entity):
+      def __init__(self, inner, x):
+        self.inner = inner
+        self.x = x
+    Outer.addConstraints('inner', Nullable = False)
+    Outer.addConstraints('x', Min = 2)
+    for event in hooks.EVENTS:
+      hooks.addHook(event, self.record)
+    outer = Outer(Inner('xxx'), 1)
+    outer.validate()
+
+    names = [(event.name, event.clazz.__name__) for event in self.events]
+    self.assertEquals(('beforeValidate', 'Outer'), names[0])
+    self.assertEquals(('afterValidate', 'Outer'), names[-1])
+    self.assertTrue(('nestedEntered', 'Outer') in names)
+    self.assertTrue(('beforeValidate', 'Inner') in names)
+    self.assertTrue(names.index(('nestedEntered', 'Outer')) < names.index(('nestedExited', 'Outer')))
+
+    failures = [event for event in self.events if event.name == hooks.CONSTRAINT_FAILED]
+    self.assertEquals(2, len(failures))
+    x = [event for event in failures if event.clazz is Outer][0]
+    self.assertEquals(outer, x.obj)
+    self.assertEquals('x', x.attributeName)
+    self.assertEquals('Min', x.constraintName)
+    self.assertEquals(1, x.value)
+    self.assertEquals('x (= 1) must be greater or equal than 2', x.message)
+    self.assertTrue(x.duration >= 0)
+
+    exited = [event for event in self.events if event.name == hooks.NESTED_EXITED][0]
+    self.assertEquals(['name (= xxx) must have length lower or equal than 2'], exited.errors)
+    after = self.events[-1]
+    self.assertEquals(outer.errors(), after.errors)
+    self.assertTrue(after.duration >= 0)
+
+  def testRemovedHookIsNotCalled(self):
+    class MyEntity(Entity):
+      def __init__(self): self.x = 1
+    MyEntity.addConstraints('x', Min = 2)
+    hooks.addHook(hooks.CONSTRAINT_FAILED, self.record)
+    MyEntity().validate()
+    hooks.removeHook(hooks.CONSTRAINT_FAILED, self.record)
+    MyEntity().validate()
+    self.assertEquals(1, len(self.events))
+
+  def testEventsOfAMappingHaveTheValidatedClass(self):
+    class MyEntity(Entity):
+      def __init__(self, x): self.x = x
+    MyEntity.addConstraints('x', Min = 2)
+    hooks.addHook(hooks.BEFORE_VALIDATE, self.record)
+    hooks.addHook(hooks.CONSTRAINT_FAILED, self.record)
+    MyEntity.validateMapping({'x': 1})
+    MyEntity.validateRows([(1,)], columns = ['x'])
+    self.assertEquals([MyEntity] * 4, [event.clazz for event in self.events])
+    self.assertEquals({'x': 1}, self.events[0].obj)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,70 @@
+'''
+Tests of the identity map
+'''
+
+import gc
+import unittest
+from domain.identity import *
+from domain.dataobjects import *
+
+class Customer(Entity):
+  identifier = 'id'
+  def __init__(self, id, name = None):
+    self.id = id
+    self.name = name
+
+class IdentityMapTest(unittest.TestCase):
+
+  def testAddReturnsTheInstanceOfTheSession(self):
+    session = IdentityMap()
+    first = Customer(1)
+    self.assertTrue(session.add(first) is first)
+    self.assertTrue(session.add(Customer(1)) is first)
+    self.assertTrue(session.get(Customer, 1) is first)
+    self.assertEquals(None, session.get(Customer, 2))
+    self.assertTrue(first in session)
+    self.assertFalse(Customer(1) in session)
+
+  def testLoadCallsTheLoaderOnlyForNewEntities(self):
+    loaded = []
+    def loader(id):
+      loaded.append(id)
+      return Customer(id)
+    session = IdentityMap()
+    customer = session.load(Customer, 1, loader)
+    self.assertTrue(session.load(Customer, 1, loader) is customer)
+    self.assertEquals([1], loaded)
+
+  def testDedupe(self):
+    session = IdentityMap()
+    customers = [Customer(1, 'a'), Customer(2), Customer(1, 'b'), Customer(3), Customer(2)]
+    unique = session.dedupe(customers)
+    self.assertEquals([1, 2, 3], [customer.id for customer in unique])
+    self.assertEquals('a', unique[0].name)
+
+  def testEntitiesAreKeptByWeakReferences(self):
+    session = IdentityMap()
+    session.add(Customer(1))
+    gc.collect()
+    self.assertEquals(0, len(session))
+
+  def testSessionIsClearedAtTheEndOfTheWithBlock(self):
+    customer = Customer(1)
+    with IdentityMap() as session:
+      session.add(customer)
+      self.assertEquals(1, len(session))
+    self.assertEquals(0, len(session))
+
+  def testEntitiesWithoutIdentityMustRaiseAnException(self):
+    class Anonymous(Entity): pass
+    for entity in [Anonymous(), Customer(None)]:
+      try:
+        IdentityMap().add(entity)
+      except IdentityMapException:
+        pass
+      else:
+        self.fail()
+
+
+if __name__ == "__main__":
+  unittest.main()
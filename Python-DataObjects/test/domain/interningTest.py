@@ -0,0 +1,85 @@
+'''
+Tests of the flyweights of ValueObjects
+'''
+
+import gc
+import unittest
+from domain.interning import *
+from domain.dataobjects import *
+
+class Money(ValueObject):
+  def __init__(self, currency, amount):
+    self.currency = currency
+    self.amount = amount
+Money.addConstraints('amount', Min = 0)
+
+class InternerTest(unittest.TestCase):
+
+  def testEqualObjectsAreTheSameInstance(self):
+    money = Interner(Money)
+    a = money('BRL', 10)
+    b = money('BRL', 10)
+    self.assertTrue(a is b)
+    self.assertFalse(a is money('BRL', 11))
+    self.assertEquals(1, money.hits)
+    self.assertEquals(2, money.misses)
+    self.assertTrue(money.stats()['bytesSaved'] > 0)
+    self.assertEquals(1 / 3.0, money.hitRate())
+
+  def testValidationResultIsComputedOnce(self):
+    calls = []
+    class Code(ValueObject):
+      incrementalValidation = True
+      def __init__(self, code): self.code = code
+    Code.addConstraints('code', Custom = lambda code: calls.append(code) or code.isupper())
+    codes = Interner(Code)
+    alive = [codes('br'), codes('BR')]
+    for i in range(100):
+      self.assertEquals(False, codes('br').valid())
+      self.assertEquals(True, codes('BR').valid())
+    self.assertEquals(['br', 'BR'], calls)
+
+  def testEqualValuesOfDifferentClassesAreNotShared(self):
+    class Price(ValueObject):
+      def __init__(self, amount): self.amount = amount
+    Price.addConstraints('amount', Scale = 2)
+    prices = Interner(Price)
+    integer = prices(1)
+    real = prices(1.0)
+    self.assertFalse(integer is real)
+    self.assertEquals(float, real.amount.__class__)
+    self.assertEquals(True, real.valid())
+
+  def testObjectsEqualByEqualsVariablesKeepTheirOtherValues(self):
+    class Fund(ValueObject):
+      def __init__(self, currency, amount):
+        self.currency = currency
+        self.amount = amount
+      def equalsVariables(self):
+        return ['currency']
+    Fund.addConstraints('amount', Min = 0)
+    funds = Interner(Fund)
+    positive = funds('BRL', 10)
+    negative = funds('BRL', -5)
+    self.assertFalse(positive is negative)
+    self.assertEquals(-5, negative.amount)
+    self.assertEquals(False, negative.valid())
+
+  def testCanonicalObjectsAreReleased(self):
+    money = Interner(Money)
+    money('USD', 1)
+    gc.collect()
+    self.assertEquals(0, len(money))
+
+  def testUnhashableObjectsAreNotInterned(self):
+    money = Interner(Money)
+    a = money('BRL', [1])
+    self.assertFalse(a is money('BRL', [1]))
+    self.assertEquals(2, money.uncacheable)
+
+  def testInternerForReturnsTheSameInterner(self):
+    self.assertTrue(internerFor(Money) is internerFor(Money))
+
+
+if __name__ == "__main__":
+  unittest.main()
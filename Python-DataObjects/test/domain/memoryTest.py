@@ -0,0 +1,55 @@
+'''
+Tests of the memory diagnostics
+'''
+
+import tracemalloc
+import unittest
+from domain.memory import *
+from domain.dataobjects import *
+
+class Tracked(Entity):
+  def __init__(self, name):
+    self.name = name
+    self.tags = ['x'] * 100
+Tracked.addConstraints('name', Nullable = False, Matches = '^[a-z]+$', Custom = lambda name: list(range(1000)) is not None)
+
+class MemoryTest(unittest.TestCase):
+
+  def testLiveInstancesPerClass(self):
+    objects = [Tracked('a') for i in range(50)]
+    rows = [row for row in liveInstances() if row['class'] == 'Tracked']
+    self.assertEquals(1, len(rows))
+    self.assertEquals(50, rows[0]['instances'])
+    self.assertTrue(rows[0]['retained'] > rows[0]['size'] > 0)
+
+  def testConstraintAllocations(self):
+    rows = constraintAllocations(Tracked('abc'), repeat = 2)
+    self.assertEquals(4, len(rows))
+    self.assertEquals(('name', 'Custom'), (rows[0]['attribute'], rows[0]['constraint']))
+    self.assertTrue(rows[0]['peak'] > 1000 * 8)
+    self.assertEquals(None, rows[-1]['constraint'])
+    self.assertTrue(rows[-1]['peak'] >= rows[0]['peak'])
+
+  def testEachRepetitionOfAValueObjectIsValidated(self):
+    calls = []
+    class Code(ValueObject):
+      incrementalValidation = True
+      validationCacheSize = 10
+      def __init__(self, code): self.code = code
+    Code.addConstraints('code', Custom = lambda code: calls.append(code) or True)
+    constraintAllocations(Code('a'), repeat = 3)
+    self.assertEquals(6, len(calls))
+
+  def testPeakOfABatch(self):
+    result, usage = measure(lambda: [Tracked('a') for i in range(100)])
+    self.assertEquals(100, len(result))
+    self.assertTrue(usage.peak >= usage.retained > 100 * 800)
+
+  def testTracemallocIsOnlyRunningWhileMeasuring(self):
+    with tracking():
+      self.assertTrue(tracemalloc.is_tracing())
+    self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == "__main__":
+  unittest.main()
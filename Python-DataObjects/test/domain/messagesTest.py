@@ -0,0 +1,58 @@
+'''
+Tests of the catalog of messages
+'''
+
+import threading
+import unittest
+from domain import messages
+from domain.validator import *
+from domain.dataobjects import *
+
+class MessagesTest(unittest.TestCase):
+
+  def tearDown(self):
+    messages.setLocale(None)
+    messages.setDefaultLocale('en')
+
+  def testTemplatesAreCompiledToFormats(self):
+    self.assertEquals('%(attr)s (= %(value)s) 100%% $', messages.compileTemplate('$attr (= ${value}) 100% $$'))
+
+  def testEnglishIsTheDefault(self):
+    self.assertEquals('a (= 1) must be greater or equal than 2', MinConstraint('a', 2, 1).message())
+    self.assertEquals('a (= ab) must have length greater or equal than 3', MinConstraint('a', 3, 'ab').message())
+
+  def testLocaleOfTheThread(self):
+    messages.setLocale('pt')
+    self.assertEquals('a (= 1) deve ser maior ou igual a 2', MinConstraint('a', 2, 1).message())
+    messages.setLocale('es')
+    self.assertEquals('a (= None) debe ser distinto de None', NullableConstraint('a', False, None).message())
+    results = []
+    thread = threading.Thread(target=lambda: results.append(NullableConstraint('a', False, None).message()))
+    thread.start()
+    thread.join()
+    self.assertEquals(['a (= None) must be different of None'], results)
+
+  def testLocaleInsideAWithBlock(self):
+    class Period(DataObject):
+      def __init__(self): self.start, self.end = 2, 1
+    Period.addConstraints('start', Max = 1)
+    Period.addCrossConstraint('order', ['start', 'end'], lambda start, end: start <= end)
+    with messages.locale('pt'):
+      self.assertEquals(['start (= 2) deve ser menor ou igual a 1', 'start, end (= 2, 1) devem satisfazer order'], Period().errors())
+    self.assertEquals('start (= 2) must be lower or equal than 1', Period().errors()[0])
+
+  def testMissingTranslationsFallBackToEnglish(self):
+    messages.register('fr', 'Min', 'value', '$attr (= $value) doit etre superieur ou egal a $required')
+    with messages.locale('fr'):
+      self.assertEquals('a (= 1) doit etre superieur ou egal a 2', MinConstraint('a', 2, 1).message())
+      self.assertEquals('a (= 3) must be lower or equal than 2', MaxConstraint('a', 2, 3).message())
+    messages.setDefaultLocale('es')
+    self.assertEquals('a (= 3) debe ser menor o igual que 2', MaxConstraint('a', 2, 3).message())
+
+  def testAllLocalesHaveTheSameMessages(self):
+    for localeName in ['pt', 'es']:
+      self.assertEquals(sorted(messages.CATALOGS['en']), sorted(messages.CATALOGS[localeName]))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,93 @@
+'''
+Tests of the persistence in SQLite
+'''
+
+import sqlite3
+import unittest
+from domain.persistence import *
+from domain.dataobjects import *
+
+class Customer(Entity):
+  identifier = 'id'
+  def __init__(self, id, name, balance, kind = 'person', active = True):
+    self.id = id
+    self.name = name
+    self.balance = balance
+    self.kind = kind
+    self.active = active
+Customer.addConstraints('name', Nullable = False, Min = 2)
+Customer.addConstraints('balance', Min = 0, Max = 1000)
+Customer.addConstraints('kind', InList = ['person', 'company'])
+
+class SQLiteStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.store = SQLiteStore(':memory:', Customer, checks = True)
+
+  def tearDown(self):
+    self.store.close()
+
+  def testOnlyValidObjectsAreInserted(self):
+    customers = [Customer(i, 'c' + str(i), i * 10) for i in range(1, 201)]
+    result = self.store.insert(customers, chunkSize = 50)
+    self.assertEquals(100, result.inserted)
+    self.assertEquals(100, len(result.rejected))
+    self.assertEquals(4, result.chunks)
+    self.assertEquals(['balance (= 1010) must be lower or equal than 1000'], result.rejected[0][1])
+    self.assertEquals(100, self.store.count())
+    self.assertTrue(result.rowsPerSecond > 0)
+
+  def testSelectBuildsTheObjectsLazily(self):
+    self.store.insert([Customer(1, 'ana', 10), Customer(2, 'bob', 20, 'company', False)])
+    selected = self.store.select('balance > ?', (15,))
+    bob = next(selected)
+    self.assertEquals(Customer, bob.__class__)
+    self.assertEquals('Customer: active=(False), balance=(20), id=(2), kind=(company), name=(bob)', str(bob))
+    self.assertEquals(False, bob.active)
+    self.assertEquals([], bob.errors())
+    self.assertEquals([1, 2], [customer.id for customer in self.store.select()])
+
+  def testChecksAreAddedToTheTable(self):
+    self.store.insert([Customer(1, 'ana', 10)])
+    for values in [(2, 'bob', -1, 'person', 1), (3, 'x', 1, 'person', 1), (4, 'bob', 1, 'alien', 1), (5, None, 1, 'person', 1)]:
+      try:
+        with self.store.connection:
+          self.store.connection.execute('INSERT INTO Customer (id, name, balance, kind, active) VALUES (?, ?, ?, ?, ?)', values)
+      except sqlite3.IntegrityError:
+        pass
+      else:
+        self.fail(values)
+
+  def testIdentifierIsThePrimaryKey(self):
+    self.store.insert([Customer(1, 'ana', 10)])
+    duplicated = Customer(1, 'bob', 10)
+    result = self.store.insert([Customer(2, 'bob', 10), duplicated, Customer(3, 'carl', 10)])
+    self.assertEquals(2, result.inserted)
+    self.assertEquals(1, len(result.rejected))
+    self.assertTrue(result.rejected[0][0] is duplicated)
+    self.assertTrue('UNIQUE' in result.rejected[0][1][0])
+    self.assertEquals(['ana', 'bob', 'carl'], [customer.name for customer in self.store.select()])
+
+  def testChecksOfTheTableFollowTheGroup(self):
+    class Contact(Entity):
+      def __init__(self, name, email):
+        self.name = name
+        self.email = email
+    Contact.addConstraints('email', Nullable = False)
+    Contact.addConstraints('email', Nullable = True, group = 'draft')
+    with SQLiteStore(':memory:', Contact, checks = True, group = 'draft') as store:
+      result = store.insert([Contact('a', None)])
+      self.assertEquals(1, result.inserted)
+      self.assertEquals([], result.rejected)
+
+  def testExistingTableIsReused(self):
+    connection = sqlite3.connect(':memory:')
+    SQLiteStore(connection, Customer).insert([Customer(1, 'ana', 10)])
+    store = SQLiteStore(connection, Customer)
+    self.assertEquals(['active', 'balance', 'id', 'kind', 'name'], store.fields)
+    self.assertEquals(['ana'], [customer.name for customer in store.select()])
+    self.assertEquals(True, next(store.select()).active)
+
+
+if __name__ == "__main__":
+  unittest.main()
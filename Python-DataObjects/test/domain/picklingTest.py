@@ -0,0 +1,121 @@
+'''
+Tests of the compact pickling of DataObjects
+'''
+
+import copy
+import pickle
+import threading
+import unittest
+from domain import pickling
+from domain.dataobjects import *
+
+class Item(Entity):
+  compactPickling = True
+  def __init__(self, name, price, tags = None):
+    self.name = name
+    self.price = price
+    self.tags = tags
+Item.addConstraints('price', Min = 0)
+
+class Money(ValueObject):
+  compactPickling = True
+  def __init__(self, currency, amount):
+    self.currency = currency
+    self.amount = amount
+
+class Order(Entity):
+  compactPickling = True
+  def __init__(self, items, total):
+    self.items = items
+    self.total = total
+
+class Plain(Entity):
+  def __init__(self, name):
+    self.name = name
+
+class Guarded(Entity):
+  compactPickling = True
+  def __init__(self, name):
+    self.name = name
+    self.lock = threading.Lock()
+  def __getstate__(self):
+    state = dict(vars(self))
+    del state['lock']
+    return state
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.lock = threading.Lock()
+
+class CompactPicklingTest(unittest.TestCase):
+
+  def testRoundTrip(self):
+    item = Item('pen', 2, ['office'])
+    copied = pickle.loads(pickle.dumps(item))
+    self.assertEquals(Item, copied.__class__)
+    self.assertEquals(vars(item), vars(copied))
+    self.assertEquals(Money('BRL', 10), pickle.loads(pickle.dumps(Money('BRL', 10))))
+
+  def testNestedObjectsAndCycles(self):
+    order = Order([Item('pen', 2), Item('ink', -1)], Money('BRL', 1))
+    order.items[0].order = order
+    copied = pickle.loads(pickle.dumps(order))
+    self.assertTrue(copied.items[0].order is copied)
+    self.assertEquals(['price (= -1) must be greater or equal than 0'], copied.items[1].errors())
+
+  def testInternalStateIsNotPickled(self):
+    item = Item('pen', -1)
+    item.validate()
+    copied = pickle.loads(pickle.dumps(item))
+    self.assertEquals(['name', 'price', 'tags'], sorted(vars(copied)))
+    self.assertEquals(['name', 'price', 'tags'], sorted(vars(copy.deepcopy(item))))
+
+  def testSchemaIsWrittenOncePerStream(self):
+    items = [Item('i' + str(i), i) for i in range(100)]
+    self.assertEquals(1, pickle.dumps(items).count(b'price'))
+
+  def testClassesAreNotCompactByDefault(self):
+    plain = Plain('pen')
+    self.assertEquals(object.__reduce_ex__(plain, 4), plain.__reduce_ex__(4))
+    self.assertEquals('pen', pickle.loads(pickle.dumps(plain)).name)
+
+  def testOwnGetstateAndSetstateAreUsed(self):
+    guarded = pickle.loads(pickle.dumps(Guarded('pen')))
+    self.assertEquals('pen', guarded.name)
+    self.assertTrue(guarded.lock is not None)
+    self.assertEquals(['pen', 'ink'], [obj.name for obj in pickling.loads(pickling.dumps([Guarded('pen'), Guarded('ink')]))])
+
+  def testStateOfTheDefaultPickleIsAccepted(self):
+    item = Item.__new__(Item)
+    item.__setstate__({'name': 'pen', 'price': 2})
+    self.assertEquals(2, item.price)
+
+
+class BatchPicklingTest(unittest.TestCase):
+
+  def testBatchRoundTrip(self):
+    items = [Item('i' + str(i), i) for i in range(100)]
+    items[5].extra = 'x'
+    copied = pickling.loads(pickling.dumps(items))
+    self.assertEquals(list, copied.__class__)
+    self.assertEquals([vars(item) for item in items], [vars(item) for item in copied])
+    self.assertEquals([], pickling.loads(pickling.dumps([])))
+
+  def testBatchInsideOtherData(self):
+    data = pickle.dumps({'items': pickling.Batch([Item('pen', 1)])})
+    self.assertEquals('pen', pickle.loads(data)['items'][0].name)
+
+  def testBatchIsSmallerThanTheDefaultPickle(self):
+    items = [Item('i' + str(i), i, ['a', 'b']) for i in range(1000)]
+    self.assertTrue(len(pickling.dumps(items)) < len(pickle.dumps(items, pickle.HIGHEST_PROTOCOL)))
+
+  def testObjectsOfManyClassesMustRaiseAnException(self):
+    try:
+      pickling.dumps([Item('pen', 1), Money('BRL', 1)])
+    except pickle.PicklingError:
+      pass
+    else:
+      self.fail()
+
+
+if __name__ == "__main__":
+  unittest.main()
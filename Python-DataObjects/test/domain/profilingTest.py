@@ -0,0 +1,67 @@
+'''
+Tests of the validation statistics
+'''
+
+import unittest
+from domain import profiling
+from domain.dataobjects import *
+
+class ProfilingTest(unittest.TestCase):
+
+  def setUp(self):
+    profiling.reset()
+
+  def tearDown(self):
+    profiling.disable()
+    profiling.reset()
+
+  def rows(self, attributeName=None, constraintName=None):
+    return [row for row in profiling.snapshot()
+            if row['attribute'] == attributeName and row['constraint'] == constraintName]
+
+  def testDisabledProfilingMustNotCollectAnything(self):
+    class MyEntity(Entity):
+      def __init__(self): self.x = 1
+    MyEntity.addConstraints('x', Min = 2)
+    MyEntity().validate()
+    self.assertEquals(False, profiling.enabled())
+    self.assertEquals([], profiling.snapshot())
+
+  def testEnabledProfilingMustCountCallsAndFailuresPerConstraint(self):
+    class MyEntity(Entity):
+      def __init__(self, x): self.x = x
+    MyEntity.addConstraints('x', Min = 2, Max = 5)
+    profiling.enable()
+    self.assertEquals(True, profiling.enabled())
+    MyEntity(1).validate()
+    MyEntity(3).validate()
+    self.assertEquals(['x (= 1) must be greater or equal than 2'], MyEntity(1).errors())
+    minimum = self.rows('x', 'Min')[0]
+    self.assertEquals('MyEntity', minimum['class'])
+    self.assertEquals(3, minimum['calls'])
+    self.assertEquals(2, minimum['failures'])
+    self.assertTrue(minimum['totalTime'] >= minimum['maxTime'] > 0)
+    self.assertTrue(minimum['messageTime'] > 0)
+    maximum = self.rows('x', 'Max')[0]
+    self.assertEquals(3, maximum['calls'])
+    self.assertEquals(0, maximum['failures'])
+    self.assertEquals(0.0, maximum['messageTime'])
+    validation = self.rows()[0]
+    self.assertEquals(3, validation['calls'])
+    self.assertEquals(2, validation['failures'])
+
+  def testStatisticsMustBeKeptAfterDisableUntilReset(self):
+    class MyEntity(Entity):
+      def __init__(self): self.x = 1
+    MyEntity.addConstraints('x', Min = 2)
+    profiling.enable()
+    MyEntity().validate()
+    profiling.disable()
+    MyEntity().validate()
+    self.assertEquals(1, self.rows('x', 'Min')[0]['calls'])
+    profiling.reset()
+    self.assertEquals([], profiling.snapshot())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,169 @@
+'''
+Tests of the binary storage of ValueObjects
+'''
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from domain.dataobjects import *
+from domain.storage import *
+
+class Money(ValueObject):
+  def __init__(self, currency, amount, cents=None, active=True):
+    self.currency = currency
+    self.amount = amount
+    self.cents = cents
+    self.active = active
+Money.addConstraints('currency', Nullable = False, Max = 3)
+
+class StorageTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'money.pdo')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testWriteAndReadMustPreserveValues(self):
+    moneys = [Money('BRL', 1.5, 10), Money('USD', 2, None, False), Money(None, 3.25, 7)]
+    self.assertEquals(3, write(self.path, moneys))
+    with MappedCollection(self.path, Money) as collection:
+      self.assertEquals(3, len(collection))
+      self.assertEquals(moneys, list(collection))
+      self.assertEquals(Money, collection[0].__class__)
+      self.assertEquals(2.0, collection[1].amount)
+      self.assertEquals(None, collection[1].cents)
+      self.assertEquals(None, collection[-1].currency)
+      for index, money in enumerate(moneys):
+        for field in money.fields():
+          self.assertEquals(vars(money)[field], collection.field(index, field))
+
+  def testStringsMustSupportUnicode(self):
+    write(self.path, [Money('R$', 1.0), Money('€', 2.0)])
+    with MappedCollection(self.path, Money) as collection:
+      self.assertEquals('€', collection[1].currency)
+
+  def testViewMustDecodeOnlyTheRequestedField(self):
+    write(self.path, [Money('BRL', 1.0, 5), Money('USD', 2.0, 6)])
+    with MappedCollection(self.path, Money) as collection:
+      view = collection.view(1)
+      self.assertEquals('USD', view.currency)
+      self.assertEquals(6, view.cents)
+      self.assertEquals(6, collection.field(1, 'cents'))
+      try:
+        view.inexistent
+      except AttributeError: pass
+      else: self.fail()
+
+  def testIndexOutOfRangeMustRaiseIndexError(self):
+    write(self.path, [Money('BRL', 1.0)])
+    with MappedCollection(self.path, Money) as collection:
+      try:
+        collection[1]
+      except IndexError: pass
+      else: self.fail()
+
+  def testEmptyCollectionNeedsTheClass(self):
+    try:
+      write(self.path, [])
+    except StorageException: pass
+    else: self.fail()
+    write(self.path, [], Money)
+    with MappedCollection(self.path, Money) as collection:
+      self.assertEquals(0, len(collection))
+
+  def testUnsupportedTypesMustRaiseAStorageException(self):
+    try:
+      write(self.path, [Money('BRL', [1, 2])])
+    except StorageException: pass
+    else: self.fail()
+
+  def testMixedTypesMustRaiseAStorageException(self):
+    try:
+      write(self.path, [Money('BRL', 1.0), Money(1, 1.0)])
+    except StorageException: pass
+    else: self.fail()
+
+  def testExtraVariablesMustRaiseAStorageException(self):
+    extra = Money('USD', 2.0)
+    extra.rate = 5
+    try:
+      write(self.path, [Money('BRL', 1.0), extra])
+    except StorageException: pass
+    else: self.fail()
+
+  def testChangedConstraintsMustBeDetected(self):
+    class Point(ValueObject):
+      def __init__(self, x): self.x = x
+    Point.addConstraints('x', Min = 1)
+    write(self.path, [Point(1), Point(2)])
+    Point.addConstraints('x', Min = 2)
+    try:
+      MappedCollection(self.path, Point)
+    except StorageException: pass
+    else: self.fail()
+
+  def testChangedConstraintsOfAGroupMustBeDetected(self):
+    class Point(ValueObject):
+      def __init__(self, x): self.x = x
+    Point.addConstraints('x', Min = 1, group = 'strict')
+    write(self.path, [Point(1)])
+    MappedCollection(self.path, Point).close()
+    Point.addConstraints('x', Min = 2, group = 'strict')
+    try:
+      MappedCollection(self.path, Point)
+    except StorageException: pass
+    else: self.fail()
+
+  def testFingerprintDoesNotDependOnTheHashSeed(self):
+    script = '''
+import sys
+from domain.dataobjects import ValueObject
+from domain import storage
+class Money(ValueObject):
+  def __init__(self, currency): self.currency = currency
+Money.addConstraints('currency', InList = {'BRL', 'USD', 'EUR', 'ARS', 'CLP'}, Each = {'Min': 1, 'collect': True})
+if sys.argv[1] == 'write': storage.write(sys.argv[2], [Money('BRL')])
+else: storage.MappedCollection(sys.argv[2], Money).close()
+'''
+    import domain
+    environment = dict(os.environ, PYTHONPATH = os.path.dirname(os.path.dirname(os.path.abspath(domain.__file__))))
+    for seed, action in [('1', 'write'), ('2', 'read'), ('3', 'read'), ('4', 'read')]:
+      environment['PYTHONHASHSEED'] = seed
+      process = subprocess.run([sys.executable, '-c', script, action, self.path], env = environment,
+                               stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+      self.assertEquals(0, process.returncode, process.stderr)
+
+  def testValuesWithoutAStableDescriptionMustRaiseAStorageException(self):
+    class Point(ValueObject):
+      def __init__(self, x): self.x = x
+    Point.addConstraints('x', InList = [object()])
+    try:
+      write(self.path, [Point(1)])
+    except StorageException: pass
+    else: self.fail()
+
+  def testAnotherClassMustBeDetected(self):
+    class Point(ValueObject):
+      def __init__(self, x): self.x = x
+    write(self.path, [Money('BRL', 1.0)])
+    try:
+      MappedCollection(self.path, Point)
+    except StorageException: pass
+    else: self.fail()
+
+  def testInvalidFileMustRaiseAStorageException(self):
+    with open(self.path, 'wb') as output:
+      output.write(b'not a collection')
+    try:
+      MappedCollection(self.path, Money)
+    except StorageException: pass
+    else: self.fail()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -361,6 +361,101 @@ class CustomConstraintTest(unittest.TestCase):
     self.assertEquals('VariableName (= 2) must be satisfied by specific function', 
                     CustomConstraint('VariableName', lambda x: x == True, 2).message())
 
+class EachConstraintTest(unittest.TestCase):
+
+  def testValidMustCheckEveryElement(self):
+    self.assertEquals(True, EachConstraint('a', {'Min': 0, 'Max': 10}, [0, 5, 10]).valid())
+    self.assertEquals(True, EachConstraint('a', {'Min': 0}, []).valid())
+    self.assertEquals(False, EachConstraint('a', {'Min': 0, 'Max': 10}, (0, 11)).valid())
+    self.assertEquals(True, EachConstraint('a', {'InList': ['x', 'y']}, ['x', 'y', 'x']).valid())
+    self.assertEquals(False, EachConstraint('a', {'Matches': '^[a-z]+$'}, ['ok', 'NOT']).valid())
+
+  def testValidMustStopAtTheFirstFailureByDefault(self):
+    constraint = EachConstraint('a', {'Min': 0}, [1, -1, -2, 3, -4])
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals([1], constraint.failures)
+    self.assertEquals('a[1] (= -1) must be greater or equal than 0', constraint.message())
+
+  def testCollectMustKeepAllInvalidIndices(self):
+    constraint = EachConstraint('a', {'Min': 0, 'collect': True}, [1, -1, -2, 3, -4])
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals([1, 2, 4], constraint.failures)
+    self.assertEquals('a has 3 invalid elements at [1, 2, 4]: a[1] (= -1) must be greater or equal than 0', constraint.message())
+
+  def testNumbersAndNonNumbersGiveTheSameResult(self):
+    self.assertEquals(False, EachConstraint('a', {'Max': 1.5}, [1, 2.0]).valid())
+    self.assertEquals(False, EachConstraint('a', {'Min': 0}, [1.0, float('nan')]).valid())
+    self.assertEquals(False, EachConstraint('a', {'Min': 0}, [1, None]).valid())
+    self.assertEquals(True, EachConstraint('a', {'Min': 2}, ['ab', 'abc']).valid())
+
+  def testDictValuesAndKeys(self):
+    self.assertEquals(True, EachConstraint('a', {'Min': 0}, {'x': 1, 'y': 2}).valid())
+    constraint = EachConstraint('a', {'Min': 0}, {'x': 1, 'y': -2})
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals("a['y'] (= -2) must be greater or equal than 0", constraint.message())
+    constraint = EachKeyConstraint('a', {'Matches': '^[a-z]+$'}, {'x': 1, 'Y': 2})
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals('a key (= Y) must matches ^[a-z]+$', constraint.message())
+
+  def testValueThatIsNotACollectionIsInvalid(self):
+    constraint = EachConstraint('a', {'Min': 0}, None)
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals('a (= None) must be a list, tuple or dict', constraint.message())
+    self.assertEquals(False, EachKeyConstraint('a', {'Min': 0}, [1]).valid())
+
+  def testNestedEach(self):
+    self.assertEquals(False, EachConstraint('a', {'Each': {'Max': 1}}, [[0, 1], [2]]).valid())
+
+  @unittest.skipIf(numpy is None, 'numpy is not installed')
+  def testNumpyArrays(self):
+    values = numpy.array([1.0, -1.0, numpy.nan, 5.0])
+    constraint = EachConstraint('a', {'Min': 0, 'collect': True}, values)
+    self.assertEquals(False, constraint.valid())
+    self.assertEquals([1, 2], constraint.failures)
+    self.assertEquals(True, EachConstraint('a', {'Min': 0, 'Max': 5}, numpy.arange(6)).valid())
+
+
+class MemoizedFunctionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.calls = []
+
+  def function(self, value):
+    self.calls.append(value)
+    return value == 'x'
+
+  def testRepeatedValuesMustCallTheFunctionOnce(self):
+    memoized = MemoizedFunction(self.function)
+    self.assertEquals(True, CustomConstraint('attr', memoized, 'x').valid())
+    self.assertEquals(True, CustomConstraint('attr', memoized, 'x').valid())
+    self.assertEquals(False, CustomConstraint('attr', memoized, 'y').valid())
+    self.assertEquals(['x', 'y'], self.calls)
+    self.assertEquals(1, memoized.stats()['hits'])
+    self.assertEquals(2, memoized.stats()['misses'])
+
+  def testEqualValuesOfDifferentTypesAreDifferentKeys(self):
+    memoized = MemoizedFunction(lambda value: isinstance(value, int))
+    self.assertEquals(True, memoized(1))
+    self.assertEquals(False, memoized(1.0))
+
+  def testUnhashableValuesMustCallTheFunction(self):
+    memoized = MemoizedFunction(lambda value: len(value) == 2)
+    self.assertEquals(True, memoized([1, 2]))
+    self.assertEquals(True, memoized([1, 2]))
+    self.assertEquals(2, memoized.stats()['uncacheable'])
+    self.assertEquals(0, memoized.stats()['size'])
+
+  def testCacheIsBounded(self):
+    memoized = MemoizedFunction(self.function, maxSize = 2)
+    for value in ['a', 'b', 'c', 'a']:
+      memoized(value)
+    self.assertEquals(['a', 'b', 'c', 'a'], self.calls)
+    self.assertEquals(2, memoized.stats()['size'])
+
+  def testWrapperKeepsTheNameOfTheFunction(self):
+    def checksum(value): return True
+    self.assertEquals('checksum', MemoizedFunction(checksum).__name__)
+
 '''
 General tests
 '''